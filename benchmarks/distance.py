@@ -0,0 +1,57 @@
+"""Compare activity distance methods against geopy for speed and accuracy.
+
+Run with `python -m benchmarks.distance`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+from geopy.distance import distance as geo_distance
+
+from benchmarks.generators import random_walk
+from scripts.activity import geodesic_m, haversine_m
+
+SIZES = [1_000, 10_000, 86_400]
+
+
+def geopy_m(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Reference implementation: the per-pair geopy loop."""
+    points = list(zip(lats.tolist(), lons.tolist()))
+    return np.array([geo_distance(prev, curr).meters for prev, curr in zip(points, points[1:])])
+
+
+METHODS = {
+    "geopy": geopy_m,
+    "haversine": haversine_m,
+    "geodesic": geodesic_m,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        lats, lons = random_walk(size)
+        reference: np.ndarray | None = None
+        for name, func in METHODS.items():
+            start = time.perf_counter()
+            segments = func(lats, lons)
+            elapsed = time.perf_counter() - start
+            if reference is None:
+                reference = segments
+            total_error = (segments.sum() - reference.sum()) / reference.sum()
+            segment_error = np.max(np.abs(segments - reference))
+            print(
+                f"{size:>7} points  {name:<9}  {elapsed * 1000:9.2f} ms  "
+                f"total {segments.sum():11.1f} m  rel err {total_error:+.4%}  "
+                f"max segment err {segment_error:.2e} m"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Seeded synthetic inputs for benchmarks: tracks, histories, OSM extracts, DynamoDB items.
+
+Every generator takes a seed, so the same arguments always produce the same
+bytes and timings stay comparable across runs.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+
+from scripts.merge import time_key
+from scripts.poi import POI_TAGS
+
+# 07:30 in Hanoi; activities stay within one local day whatever the machine timezone.
+START = datetime(2026, 1, 1, 0, 30, tzinfo=timezone.utc)
+ORIGIN = (21.0, 105.85)
+TCX_NS = "http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"
+
+
+def random_walk(
+    count: int, seed: int = 0, origin: tuple[float, float] = ORIGIN
+) -> tuple[np.ndarray, np.ndarray]:
+    """A 1 Hz running track with ~3 m steps and a slowly wandering heading."""
+    rng = np.random.default_rng(seed)
+    heading = np.cumsum(rng.normal(0, 0.2, count))
+    step_deg = rng.normal(3.0, 0.5, count) / 111_320
+    lats = origin[0] + np.cumsum(step_deg * np.cos(heading))
+    lons = origin[1] + np.cumsum(step_deg * np.sin(heading))
+    return lats, lons
+
+
+def write_gpx(path: Path, count: int, seed: int = 0, start: datetime = START) -> None:
+    """A Garmin-style GPX track of count points, one per second."""
+    lats, lons = random_walk(count, seed)
+    rng = np.random.default_rng(seed + 1)
+    elevations = 10 + np.cumsum(rng.normal(0, 0.1, count))
+    with path.open("w", encoding="utf-8") as handle:
+        handle.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        handle.write('<gpx creator="bench" version="1.1" xmlns="http://www.topografix.com/GPX/1/1">\n')
+        handle.write("  <trk>\n    <type>running</type>\n    <trkseg>\n")
+        for i in range(count):
+            handle.write(
+                f'      <trkpt lat="{lats[i]:.9f}" lon="{lons[i]:.9f}">\n'
+                f"        <ele>{elevations[i]:.2f}</ele>\n"
+                f"        <time>{time_key(start + timedelta(seconds=i))}</time>\n"
+                "      </trkpt>\n"
+            )
+        handle.write("    </trkseg>\n  </trk>\n</gpx>\n")
+
+
+def write_tcx(path: Path, count: int, seed: int = 0, start: datetime = START) -> None:
+    """A TCX file with heart rate and cadence at 1 Hz, offset by half a second."""
+    rng = np.random.default_rng(seed + 2)
+    heart_rate = np.clip(120 + np.cumsum(rng.normal(0, 0.5, count)), 60, 200).astype(int)
+    cadence = rng.integers(76, 92, count)
+    with path.open("w", encoding="utf-8") as handle:
+        handle.write('<?xml version="1.0" encoding="UTF-8"?>')
+        handle.write(f'<TrainingCenterDatabase xmlns="{TCX_NS}"><Activities><Activity Sport="Running">')
+        handle.write("<Lap><Track>")
+        for i in range(count):
+            stamp = (start + timedelta(seconds=i, milliseconds=505)).isoformat()
+            handle.write(
+                f"<Trackpoint><Time>{stamp.replace('+00:00', 'Z')}</Time>"
+                f"<HeartRateBpm><Value>{heart_rate[i]}</Value></HeartRateBpm>"
+                f"<Cadence>{cadence[i]}</Cadence></Trackpoint>"
+            )
+        handle.write("</Track></Lap></Activity></Activities></TrainingCenterDatabase>\n")
+
+
+def history_starts(activities: int, start: datetime = START) -> list[datetime]:
+    """One activity start per day, going forward from start."""
+    return [start + timedelta(days=day) for day in range(activities)]
+
+
+def write_history(raw_dir: Path, activities: int, points: int, seed: int = 0) -> list[datetime]:
+    """Write a GPX/TCX pair per activity into raw_dir and return their start times."""
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    starts = history_starts(activities)
+    for index, start in enumerate(starts):
+        stem = f"bench_{start:%Y-%m-%d}"
+        write_gpx(raw_dir / f"{stem}.gpx", points, seed + index, start)
+        write_tcx(raw_dir / f"{stem}.tcx", points, seed + index, start)
+    return starts
+
+
+def write_osm(path: Path, nodes: int, seed: int = 0, poi_fraction: float = 0.05) -> None:
+    """An OSM XML extract around the origin with tagged POI nodes and closed ways.
+
+    Roughly poi_fraction of the nodes carry a POI tag; every tenth node also
+    starts a small closed way tagged as a POI area.
+    """
+    rng = np.random.default_rng(seed)
+    lats = ORIGIN[0] + rng.uniform(-0.05, 0.05, nodes)
+    lons = ORIGIN[1] + rng.uniform(-0.05, 0.05, nodes)
+    tags = [(key, value) for key, values in POI_TAGS for value in sorted(values)]
+    tagged = rng.random(nodes) < poi_fraction
+    choices = rng.integers(0, len(tags), nodes)
+    with path.open("w", encoding="utf-8") as handle:
+        handle.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6" generator="bench">\n')
+        for i in range(nodes):
+            attrs = f'id="{i + 1}" lat="{lats[i]:.7f}" lon="{lons[i]:.7f}"'
+            if tagged[i]:
+                key, value = tags[choices[i]]
+                handle.write(f'  <node {attrs}>\n    <tag k="{key}" v="{value}"/>\n  </node>\n')
+            else:
+                handle.write(f"  <node {attrs}/>\n")
+        for way_id, first in enumerate(range(0, nodes - 3, 10), start=1):
+            key, value = tags[choices[first]]
+            refs = [first + 1, first + 2, first + 3, first + 1]
+            handle.write(f'  <way id="{way_id}">\n')
+            handle.writelines(f'    <nd ref="{ref}"/>\n' for ref in refs)
+            handle.write(f'    <tag k="{key}" v="{value}"/>\n  </way>\n')
+        handle.write("</osm>\n")
+
+
+def dynamodb_items(dates: list[date], seed: int = 0) -> list[dict]:
+    """Hourly weather and traffic items per date, shaped like the context table."""
+    rng = np.random.default_rng(seed)
+    items = []
+    for day in dates:
+        for hour in range(24):
+            items.append({
+                "id": f"weather-{day.isoformat()}-{hour:02d}",
+                "date": day.isoformat(),
+                "hour": Decimal(hour),
+                "context": "weather",
+                "context_hour": f"weather#{hour:02d}",
+                "data": {
+                    "weather_description": "scattered clouds",
+                    "feels_like": Decimal(str(round(float(rng.uniform(12, 38)), 1))),
+                },
+            })
+            items.append({
+                "id": f"traffic-{day.isoformat()}-{hour:02d}",
+                "date": day.isoformat(),
+                "hour": Decimal(hour),
+                "context": "traffic",
+                "context_hour": f"traffic#{hour:02d}",
+                "data": {
+                    "currentSpeed": Decimal(int(rng.integers(5, 40))),
+                    "freeFlowSpeed": Decimal(40),
+                },
+            })
+    return items
+
+
+def project(items: list[dict], expression: str | None, names: dict | None) -> list[dict]:
+    """Keep only the (possibly nested) attribute paths of a ProjectionExpression."""
+    if expression is None:
+        return items
+    names = names or {}
+    paths = [
+        [names.get(part, part) for part in path.strip().split(".")]
+        for path in expression.split(",")
+    ]
+    projected = []
+    for item in items:
+        kept: dict = {}
+        for path in paths:
+            value = item
+            for part in path:
+                value = value.get(part) if isinstance(value, dict) else None
+            if value is None:
+                continue
+            target = kept
+            for part in path[:-1]:
+                target = target.setdefault(part, {})
+            target[path[-1]] = value
+        projected.append(kept)
+    return projected
+
+
+class FakeTable:
+    """An in-memory stand-in for a boto3 DynamoDB Table: paginated scans and index queries.
+
+    Only the indexes named in indexes can be queried; others fail like a
+    table without that GSI. scans and queries count the requests made.
+    """
+
+    def __init__(
+        self,
+        items: list[dict],
+        page_size: int = 100,
+        indexes: tuple[str, ...] = ("date-context_hour-index",),
+        name: str = "fake-table",
+    ) -> None:
+        self.items = items
+        self.page_size = page_size
+        self.indexes = indexes
+        self.name = name
+        self.scans = 0
+        self.queries = 0
+
+    def scan(
+        self,
+        FilterExpression=None,
+        ExclusiveStartKey=None,
+        ProjectionExpression=None,
+        ExpressionAttributeNames=None,
+    ) -> dict:
+        self.scans += 1
+        start = ExclusiveStartKey["offset"] if ExclusiveStartKey else 0
+        page = self.items[start : start + self.page_size]
+        if FilterExpression is not None:
+            # Only the Attr(name).eq(value) and .not_exists() conditions the scripts use.
+            expression = FilterExpression.get_expression()
+            if expression["operator"] == "attribute_not_exists":
+                (attribute,) = expression["values"]
+                page = [item for item in page if attribute.name not in item]
+            else:
+                attribute, value = expression["values"]
+                page = [item for item in page if item.get(attribute.name) == value]
+        response = {"Items": project(page, ProjectionExpression, ExpressionAttributeNames)}
+        if start + self.page_size < len(self.items):
+            response["LastEvaluatedKey"] = {"offset": start + self.page_size}
+        return response
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues) -> dict:
+        # Only the "SET name = :value" updates the scripts use are supported.
+        name, placeholder = UpdateExpression.removeprefix("SET ").split(" = ")
+        for item in self.items:
+            if all(item.get(key) == value for key, value in Key.items()):
+                item[name] = ExpressionAttributeValues[placeholder]
+        return {}
+
+    def query(
+        self,
+        IndexName,
+        KeyConditionExpression,
+        ExclusiveStartKey=None,
+        ProjectionExpression=None,
+        ExpressionAttributeNames=None,
+    ) -> dict:
+        from botocore.exceptions import ClientError
+
+        self.queries += 1
+        if IndexName not in self.indexes:
+            message = "The table does not have the specified index"
+            raise ClientError({"Error": {"Code": "ValidationException", "Message": message}}, "Query")
+        # Only the Key("date").eq(value) condition the scripts use is supported.
+        key, value = KeyConditionExpression.get_expression()["values"]
+        matches = sorted(
+            (item for item in self.items if item.get(key.name) == value and "context_hour" in item),
+            key=lambda item: item["context_hour"],
+        )
+        start = ExclusiveStartKey["offset"] if ExclusiveStartKey else 0
+        page = matches[start : start + self.page_size]
+        response = {"Items": project(page, ProjectionExpression, ExpressionAttributeNames)}
+        if start + self.page_size < len(matches):
+            response["LastEvaluatedKey"] = {"offset": start + self.page_size}
+        return response
@@ -0,0 +1,134 @@
+"""Compare tree-based and streaming GPX/TCX parsing on a synthetic 24-hour track.
+
+Run with `python -m benchmarks.merge_parse`. Each variant runs in its own
+process so peak RSS reflects only that parser.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from scripts.merge import parse_gpx, parse_tcx, time_key
+
+SECONDS = 24 * 60 * 60
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def write_synthetic_gpx(path: Path, seconds: int = SECONDS) -> None:
+    with path.open("w", encoding="utf-8") as handle:
+        handle.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        handle.write('<gpx version="1.1" creator="bench" xmlns="http://www.topografix.com/GPX/1/1">\n')
+        handle.write("  <trk>\n    <trkseg>\n")
+        for i in range(seconds):
+            stamp = time_key(START + timedelta(seconds=i))
+            handle.write(
+                f'      <trkpt lat="{21.0 + i * 1e-6:.9f}" lon="{105.8 + i * 1e-6:.9f}">\n'
+                f"        <ele>{10 + i % 50}</ele>\n"
+                f"        <time>{stamp}</time>\n"
+                "      </trkpt>\n"
+            )
+        handle.write("    </trkseg>\n  </trk>\n</gpx>\n")
+
+
+def write_synthetic_tcx(path: Path, seconds: int = SECONDS) -> None:
+    ns = "http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"
+    with path.open("w", encoding="utf-8") as handle:
+        handle.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        handle.write(f'<TrainingCenterDatabase xmlns="{ns}"><Activities><Activity Sport="Running">')
+        handle.write("<Lap><Track>")
+        for i in range(seconds):
+            stamp = (START + timedelta(seconds=i, milliseconds=505)).isoformat().replace("+00:00", "Z")
+            handle.write(
+                f"<Trackpoint><Time>{stamp}</Time>"
+                f"<HeartRateBpm><Value>{120 + i % 40}</Value></HeartRateBpm>"
+                f"<Cadence>{80 + i % 10}</Cadence></Trackpoint>"
+            )
+        handle.write("</Track></Lap></Activity></Activities></TrainingCenterDatabase>\n")
+
+
+def tree_parse_gpx(path: Path) -> list:
+    """Reference implementation: the pre-streaming ET.parse approach."""
+    from scripts.merge import _parse_gpx_point
+
+    root = ET.parse(path).getroot()
+    return [p for p in (_parse_gpx_point(t) for t in root.findall(".//{*}trkpt")) if p]
+
+
+def tree_parse_tcx(path: Path) -> dict:
+    """Reference implementation: the pre-streaming ET.parse approach."""
+    from scripts.merge import _parse_tcx_sample
+
+    root = ET.parse(path).getroot()
+    data = {}
+    for tp in root.findall(".//{*}Trackpoint"):
+        sample = _parse_tcx_sample(tp)
+        if sample:
+            dt, hr, cad = sample
+            data[time_key(dt)] = (hr, cad)
+    return data
+
+
+VARIANTS = {
+    "tree": (tree_parse_gpx, tree_parse_tcx),
+    "stream": (parse_gpx, parse_tcx),
+}
+
+
+def run_variant(variant: str, gpx_path: Path, tcx_path: Path) -> dict:
+    parse_gpx_fn, parse_tcx_fn = VARIANTS[variant]
+    start = time.perf_counter()
+    points = parse_gpx_fn(gpx_path)
+    samples = parse_tcx_fn(tcx_path)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is reported in KiB on Linux.
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "variant": variant,
+        "points": len(points),
+        "samples": len(samples),
+        "wall_s": round(elapsed, 3),
+        "peak_rss_mb": round(peak_kib / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=int, default=SECONDS)
+    parser.add_argument("--run", choices=sorted(VARIANTS), help=argparse.SUPPRESS)
+    parser.add_argument("--gpx", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--tcx", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_variant(args.run, args.gpx, args.tcx)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gpx_path = Path(tmp) / "track.gpx"
+        tcx_path = Path(tmp) / "track.tcx"
+        write_synthetic_gpx(gpx_path, args.seconds)
+        write_synthetic_tcx(tcx_path, args.seconds)
+        for variant in VARIANTS:
+            output = subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.merge_parse",
+                    "--run", variant, "--gpx", str(gpx_path), "--tcx", str(tcx_path),
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            print(output.strip())
+
+
+if __name__ == "__main__":
+    main()
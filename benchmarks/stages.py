@@ -0,0 +1,156 @@
+"""Time every analyze stage on synthetic histories and check against a baseline.
+
+Run with `python -m benchmarks.stages`. Each size builds a fresh seeded tree
+(raw GPX/TCX history, OSM extract, goals, fake DynamoDB table) in a temporary
+directory and runs `scripts.pipeline` on it with the profiler enabled.
+`--save` stores the best-of-repeats wall times in the baseline file; `--check`
+exits non-zero when any stage is slower than its baseline by more than
+`--margin`. Baselines are machine-specific, so re-save them after changing
+hardware. `describe` is not included because it calls an LLM.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterator
+
+from benchmarks.generators import FakeTable, dynamodb_items, write_history, write_osm
+from scripts import merge, pipeline
+from scripts.profiling import Profiler
+from scripts.utils import load_json, write_json
+
+# (activities, points per activity)
+SIZES = [(5, 1_800), (20, 3_600), (50, 3_600)]
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+MARGIN = 0.25
+# Stages faster than this are dominated by noise and never count as regressions.
+MIN_SECONDS = 0.05
+OSM_NODES = 50_000
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def size_key(activities: int, points: int) -> str:
+    return f"{activities}x{points}"
+
+
+@contextmanager
+def synthetic_tree(activities: int, points: int, osm_nodes: int, seed: int) -> Iterator[FakeTable]:
+    """Build a seeded data tree in a temporary directory and chdir into it."""
+    previous = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        starts = write_history(root / "data" / "raw", activities, points, seed)
+        (root / "osm").mkdir()
+        write_osm(root / "osm" / "hanoi.osm", osm_nodes, seed)
+        shutil.copy(REPO_ROOT / "goals.json", root / "goals.json")
+        # Local start dates depend on the machine's timezone, so cover both neighbours.
+        dates = sorted(
+            {(start + timedelta(days=offset)).date() for start in starts for offset in (-1, 0, 1)}
+        )
+        os.chdir(root)
+        try:
+            yield FakeTable(dynamodb_items(dates, seed))
+        finally:
+            os.chdir(previous)
+
+
+def run_once(activities: int, points: int, osm_nodes: int = OSM_NODES, seed: int = 0) -> dict:
+    """Run the pipeline once on a fresh tree and return the profiler report."""
+    with synthetic_tree(activities, points, osm_nodes, seed) as table:
+        profiler = Profiler(enabled=True, trace_memory=False)
+        runner = pipeline.Pipeline(table=table)
+        with profiler.stage(merge.STAGE) as entry:
+            merged, failures = merge.run()
+            entry["items"] = len(merged)
+        if failures:
+            raise RuntimeError(f"merge failed: {failures}")
+        runner.run(profiler=profiler)
+        return profiler.report()
+
+
+def measure(
+    sizes: list[tuple[int, int]], repeat: int, osm_nodes: int
+) -> dict[str, dict[str, float]]:
+    """Best-of-repeat wall seconds per stage for each size."""
+    results: dict[str, dict[str, float]] = {}
+    for activities, points in sizes:
+        best: dict[str, float] = {}
+        for _ in range(repeat):
+            report = run_once(activities, points, osm_nodes)
+            for stage, entry in report["stages"].items():
+                best[stage] = min(best.get(stage, float("inf")), entry["wall_s"])
+        results[size_key(activities, points)] = {
+            stage: round(value, 4) for stage, value in best.items()
+        }
+    return results
+
+
+def regressions(
+    results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], margin: float
+) -> list[str]:
+    """Describe every stage slower than baseline * (1 + margin)."""
+    failures = []
+    for size, stages in results.items():
+        for stage, seconds in stages.items():
+            reference = baseline.get(size, {}).get(stage)
+            if reference is None or seconds < MIN_SECONDS:
+                continue
+            if seconds > reference * (1 + margin):
+                failures.append(f"{size} {stage}: {seconds:.3f}s vs baseline {reference:.3f}s")
+    return failures
+
+
+def parse_size(value: str) -> tuple[int, int]:
+    activities, points = value.lower().split("x")
+    return int(activities), int(points)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes",
+        type=parse_size,
+        nargs="+",
+        default=SIZES,
+        metavar="NxPOINTS",
+        help="activities x points per activity (default: %(default)s)",
+    )
+    parser.add_argument("--osm-nodes", type=int, default=OSM_NODES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--margin", type=float, default=MARGIN)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    mode.add_argument("--check", action="store_true", help="fail if a stage regressed past the margin")
+    args = parser.parse_args(argv)
+
+    results = measure(args.sizes, args.repeat, args.osm_nodes)
+    for size, stages in results.items():
+        for stage, seconds in stages.items():
+            print(f"{size:>10}  {stage:<16} {seconds * 1000:10.1f} ms")
+
+    if args.save:
+        baseline = load_json(args.baseline) if args.baseline.exists() else {}
+        baseline.update(results)
+        write_json(args.baseline, baseline)
+    elif args.check:
+        if not args.baseline.exists():
+            raise SystemExit(f"no baseline at {args.baseline}; run with --save first")
+        failures = regressions(results, load_json(args.baseline), args.margin)
+        for failure in failures:
+            print(f"regression: {failure}", file=sys.stderr)
+        if failures:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Measure import cost and no-op startup time of the pipeline entry points.
+
+Run with `python -m benchmarks.startup`. It reports each script module's
+cumulative `-X importtime` and its heaviest top-level imports. It then
+times `python -m scripts.pipeline` and `python -m scripts.describe` on a
+synthetic tree that is already up to date, so they have nothing to do.
+It exits non-zero when a no-op run exceeds `--max-seconds`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.generators import FakeTable
+from benchmarks.stages import REPO_ROOT, synthetic_tree
+from scripts import merge, pipeline
+from scripts.store import JsonStore
+
+MODULES = [
+    "scripts.merge",
+    "scripts.activity",
+    "scripts.weather_traffic",
+    "scripts.uniqueness",
+    "scripts.context",
+    "scripts.poi",
+    "scripts.pipeline",
+    "scripts.describe",
+]
+NOOP_COMMANDS = {
+    "pipeline": ["-m", "scripts.pipeline"],
+    "describe": ["-m", "scripts.describe"],
+}
+MAX_SECONDS = 1.0
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def environment() -> dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+    return env
+
+
+def import_times(module: str | None) -> dict[str, int]:
+    """Cumulative import microseconds per top-level module imported by module.
+
+    With module=None this lists what interpreter startup itself imports.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}" if module else "pass"],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=environment(),
+    ).stderr
+    totals: dict[str, int] = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and "." not in match.group(4):
+            name = match.group(4)
+            totals[name] = max(totals.get(name, 0), int(match.group(2)))
+    if module is not None:
+        # The module itself is reported last, with everything it imported.
+        totals[module] = int(IMPORTTIME_LINE.match(stderr.splitlines()[-1]).group(2))
+    return totals
+
+
+def noop_seconds(args: list[str], repeat: int) -> float:
+    """Best wall time of running python with args in the current directory."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], check=True, capture_output=True, env=environment())
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def prepare_noop_tree(table: FakeTable) -> None:
+    """Bring the synthetic tree in the current directory fully up to date."""
+    shutil.copytree(REPO_ROOT / "prompts", "prompts")
+    merge.run()
+    pipeline.Pipeline(table=table).run()
+    descriptions = Path("data/descriptions")
+    descriptions.mkdir(parents=True, exist_ok=True)
+    # Existing descriptions are adopted by the manifest, so describe has no work.
+    for activity_id in JsonStore(Path("data/activities")).ids():
+        (descriptions / f"{activity_id}.md").write_text("# synthetic\n", encoding="utf-8")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports to list per module")
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=MAX_SECONDS,
+        help="fail when a no-op run takes longer (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    startup = import_times(None)
+    for module in MODULES:
+        totals = import_times(module)
+        total = totals.pop(module)
+        for name in startup:
+            totals.pop(name, None)
+        heaviest = sorted(totals.items(), key=lambda item: item[1], reverse=True)[: args.top]
+        listed = ", ".join(f"{name} {micros / 1000:.0f}" for name, micros in heaviest)
+        print(f"{module:<24} {total / 1000:8.1f} ms  ({listed})")
+
+    failures = []
+    with synthetic_tree(activities=3, points=600, osm_nodes=2_000, seed=0) as table:
+        prepare_noop_tree(table)
+        for name, command in NOOP_COMMANDS.items():
+            seconds = noop_seconds(command, args.repeat)
+            print(f"no-op {name:<18} {seconds * 1000:8.1f} ms")
+            if seconds > args.max_seconds:
+                failures.append(f"no-op {name} took {seconds:.3f}s > {args.max_seconds:.3f}s")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,109 @@
 from __future__ import annotations
 
+import math
 import xml.etree.ElementTree as ET
-from datetime import timezone
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+import numpy as np
 import polyline
-from shapely.geometry import LineString
-from geopy.distance import distance as geo_distance
 
-from scripts.utils import parse_iso, write_json
+from scripts.merge import EPOCH, epoch_ms, iter_elements
+from scripts.manifest import Manifest
+from scripts.simplify import simplify_indices
+from scripts.store import JsonStore
+from scripts.utils import atomic_output, parse_iso
 
 DATA_DIR = Path("data")
 GPX_DIR = DATA_DIR / "gpx"
 OUTPUT_DIR = DATA_DIR / "activities"
+TRACKS_DIR = DATA_DIR / "tracks"
+MANIFEST_PATH = DATA_DIR / "manifest.json"
+STAGE = "activity"
+SECTIONS = ("activity",)
 SIMPLIFY_DISTANCE_M = 10
+EARTH_RADIUS_M = 6_371_008.8
+DISTANCE_METHOD = "haversine"
 
 
-def _optional_text(element: ET.Element, path: str) -> str | None:
+@dataclass
+class Track:
+    """Columnar GPX track: one NumPy array per field, NaN for missing values."""
+
+    lat: np.ndarray
+    lon: np.ndarray
+    time_ms: np.ndarray
+    ele: np.ndarray
+    hr: np.ndarray
+    cad: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.time_ms)
+
+    def take(self, indices: np.ndarray) -> Track:
+        return Track(**{name: getattr(self, name)[indices] for name in TRACK_TYPECODES})
+
+    def time_at(self, index: int) -> datetime:
+        return EPOCH + timedelta(milliseconds=int(self.time_ms[index]))
+
+
+# Array typecodes per Track column, shared by the parser and NumPy dtypes.
+TRACK_TYPECODES = {
+    "lat": "d",
+    "lon": "d",
+    "time_ms": "q",
+    "ele": "f",
+    "hr": "f",
+    "cad": "f",
+}
+# Packed on-disk record layout for the binary track cache (36 bytes per point).
+TRACK_DTYPE = np.dtype([(name, typecode) for name, typecode in TRACK_TYPECODES.items()])
+
+
+def _optional_float(element: ET.Element, path: str) -> float:
     value = element.findtext(path)
-    return value if value is not None else None
+    return float(value) if value else math.nan
 
 
-def _parse_trkpt(trkpt: ET.Element) -> dict | None:
-    time_text = _optional_text(trkpt, "{*}time")
-    if not time_text:
-        return None
-    point = {
-        "lat": float(trkpt.attrib["lat"]),
-        "lon": float(trkpt.attrib["lon"]),
-        "time": parse_iso(time_text),
-    }
-    ele = _optional_text(trkpt, "{*}ele")
-    if ele is not None:
-        point["ele"] = ele
-    hr = _optional_text(trkpt, ".//{*}hr")
-    if hr is not None:
-        point["hr"] = hr
-    cad = _optional_text(trkpt, ".//{*}cad")
-    if cad is not None:
-        point["cad"] = cad
-    return point
-
-
-def parse_points(path: Path) -> list[dict]:
-    """Parse GPX trackpoints into a list of dicts."""
-    tree = ET.parse(path)
-    root = tree.getroot()
-    points: list[dict] = []
-    for trkpt in root.findall(".//{*}trkpt"):
-        point = _parse_trkpt(trkpt)
-        if point:
-            points.append(point)
-    return points
+def parse_points(path: Path) -> Track:
+    """Parse GPX trackpoints into a columnar Track."""
+    columns = {name: array(typecode) for name, typecode in TRACK_TYPECODES.items()}
+    for trkpt in iter_elements(path, "trkpt"):
+        time_text = trkpt.findtext("{*}time")
+        if not time_text:
+            continue
+        columns["lat"].append(float(trkpt.attrib["lat"]))
+        columns["lon"].append(float(trkpt.attrib["lon"]))
+        columns["time_ms"].append(epoch_ms(parse_iso(time_text)))
+        columns["ele"].append(_optional_float(trkpt, "{*}ele"))
+        columns["hr"].append(_optional_float(trkpt, ".//{*}hr"))
+        columns["cad"].append(_optional_float(trkpt, ".//{*}cad"))
+    return Track(
+        **{
+            name: np.frombuffer(columns[name], dtype=typecode)
+            for name, typecode in TRACK_TYPECODES.items()
+        }
+    )
+
+
+def write_track(path: Path, track: Track) -> None:
+    """Write a Track as a structured .npy array for fast reloads.
+
+    The file is replaced atomically, so a concurrent run never maps a partial one.
+    """
+    records = np.empty(len(track), dtype=TRACK_DTYPE)
+    for name in TRACK_TYPECODES:
+        records[name] = getattr(track, name)
+    with atomic_output(path) as tmp_path, tmp_path.open("wb") as handle:
+        np.save(handle, records, allow_pickle=False)
+
+
+def load_track(path: Path) -> Track:
+    """Memory-map a cached Track; columns are read-only views into the file."""
+    records = np.load(path, mmap_mode="r", allow_pickle=False)
+    return Track(**{name: records[name] for name in TRACK_TYPECODES})
 
 
 def to_zulu(dt) -> str:
@@ -64,33 +116,54 @@ def to_local_zulu(dt) -> str:
     return local_dt.isoformat().replace("+00:00", "Z")
 
 
-def simplify_points(points: list[dict], min_distance_m: float) -> list[dict]:
-    if len(points) < 2:
-        return points
-    # Convert meters to degrees (approx) for shapely simplification.
-    tolerance = min_distance_m / 111_320
-    line = LineString([(point["lon"], point["lat"]) for point in points])
-    simplified = line.simplify(tolerance, preserve_topology=False)
-    coord_map = {(point["lon"], point["lat"]): point for point in points}
-    return [coord_map[(lon, lat)] for lon, lat in simplified.coords]
+def simplify_points(track: Track, min_distance_m: float) -> Track:
+    if len(track) < 2:
+        return track
+    return track.take(simplify_indices(track.lat, track.lon, min_distance_m))
 
 
-def total_distance_m(points: list[dict]) -> float:
-    distance_m = 0.0
-    for prev, curr in zip(points, points[1:]):
-        distance_m += geo_distance((prev["lat"], prev["lon"]), (curr["lat"], curr["lon"])).meters
-    return distance_m
+def haversine_m(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distance between consecutive points on a spherical Earth."""
+    lat = np.radians(lats)
+    lon = np.radians(lons)
+    a = (
+        np.sin(np.diff(lat) / 2) ** 2
+        + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
 
 
-def activity_payload(points: list[dict]) -> dict:
-    start_time = points[0]["time"]
-    end_time = points[-1]["time"]
+def geodesic_m(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """WGS84 ellipsoidal distance between consecutive points (Karney, as geopy)."""
+    import pyproj
+
+    geod = pyproj.Geod(ellps="WGS84")
+    _, _, distances = geod.inv(lons[:-1], lats[:-1], lons[1:], lats[1:])
+    return np.asarray(distances)
+
+
+DISTANCE_FUNCTIONS = {
+    "haversine": haversine_m,
+    "geodesic": geodesic_m,
+}
+
+
+def total_distance_m(track: Track, method: str = DISTANCE_METHOD) -> float:
+    """Track length in meters: a vectorized haversine sum, or pyproj's WGS84 geodesic."""
+    if len(track) < 2:
+        return 0.0
+    return float(DISTANCE_FUNCTIONS[method](track.lat, track.lon).sum())
+
+
+def activity_payload(track: Track) -> dict:
+    start_time = track.time_at(0)
+    end_time = track.time_at(-1)
     moving_time = int(round((end_time - start_time).total_seconds()))
 
-    distance_m = total_distance_m(points)
+    distance_m = total_distance_m(track)
 
-    simplified_points = simplify_points(points, SIMPLIFY_DISTANCE_M)
-    encoded = polyline.encode([(pt["lat"], pt["lon"]) for pt in simplified_points])
+    simplified = simplify_points(track, SIMPLIFY_DISTANCE_M)
+    encoded = polyline.encode(list(zip(simplified.lat.tolist(), simplified.lon.tolist())))
 
     return {
         "activity": {
@@ -103,19 +176,60 @@ def activity_payload(points: list[dict]) -> dict:
     }
 
 
-def write_payload(path: Path, payload: dict) -> None:
-    write_json(path, payload)
+def track_path_for(gpx_path: Path) -> Path:
+    return TRACKS_DIR / f"{gpx_path.stem}.npy"
+
+
+def build_activity(gpx_path: Path, track_path: Path) -> dict:
+    """Parse a merged GPX, write its binary track cache and return its payload."""
+    track = parse_points(gpx_path)
+    write_track(track_path, track)
+    return activity_payload(track)
+
+
+def plan_activity(
+    gpx_path: Path, payload: dict, manifest: Manifest
+) -> tuple[dict[str, str], bool] | None:
+    """Return (inputs, stale) when the GPX must be parsed, otherwise None.
+
+    A fresh activity is still parsed when its binary track cache is missing.
+    """
+    inputs = {"gpx": manifest.file_digest(gpx_path)}
+    stale = manifest.is_stale(gpx_path.stem, STAGE, inputs, "activity" in payload)
+    if not stale and track_path_for(gpx_path).exists():
+        return None
+    return inputs, stale
+
+
+def refresh_activity(gpx_path: Path, payload: dict, manifest: Manifest) -> bool:
+    """Rebuild the activity section when the merged GPX changed.
+
+    Also writes the binary track cache if it is missing. Returns True when
+    the payload was modified.
+    """
+    plan = plan_activity(gpx_path, payload, manifest)
+    if plan is None:
+        return False
+    inputs, stale = plan
+    built = build_activity(gpx_path, track_path_for(gpx_path))
+    if not stale:
+        return False
+    # Keep enrichments from later stages; they check their own inputs.
+    payload.update(built)
+    manifest.record(gpx_path.stem, STAGE, inputs)
+    return True
 
 
 def main() -> None:
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    TRACKS_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest.load(MANIFEST_PATH)
+    store = JsonStore(OUTPUT_DIR)
     for gpx_path in sorted(GPX_DIR.glob("*.gpx")):
-        output_path = OUTPUT_DIR / f"{gpx_path.stem}.json"
-        if output_path.exists():
-            continue
-        points = parse_points(gpx_path)
-        payload = activity_payload(points)
-        write_payload(output_path, payload)
+        payload = store.load(gpx_path.stem) or {}
+        if refresh_activity(gpx_path, payload, manifest):
+            store.save(gpx_path.stem, payload, SECTIONS)
+    manifest.save()
 
 
 if __name__ == "__main__":
@@ -4,11 +4,16 @@ import random
 from datetime import datetime
 from pathlib import Path
 
-from scripts.utils import load_json, parse_iso, write_json
+from scripts.manifest import Manifest, digest_value
+from scripts.store import JsonStore
+from scripts.utils import load_json, parse_iso
 
 DATA_DIR = Path("data")
 ACTIVITIES_DIR = DATA_DIR / "activities"
 GOALS_PATH = Path("goals.json")
+MANIFEST_PATH = DATA_DIR / "manifest.json"
+STAGE = "context"
+SECTIONS = ("activity_context",)
 
 DISTANCE_WORDS = [
     "minuscule",
@@ -192,15 +197,38 @@ def build_context(activity: dict, goals: dict[str, float]) -> dict:
     return context
 
 
+def stage_inputs(activity: dict, goals_digest: str) -> dict[str, str]:
+    fields = [field for field, _ in GOAL_FIELDS] + ["start_date_local"]
+    return {
+        "goals": goals_digest,
+        "activity": digest_value({field: activity.get(field) for field in fields}),
+    }
+
+
+def refresh_context(
+    activity_id: str, payload: dict, manifest: Manifest, goals: dict, goals_digest: str
+) -> bool:
+    """Rebuild activity_context when goals or activity fields changed."""
+    activity = payload.get("activity") or {}
+    inputs = stage_inputs(activity, goals_digest)
+    has_output = payload.get("activity_context") is not None
+    if not manifest.is_stale(activity_id, STAGE, inputs, has_output):
+        return False
+    payload["activity_context"] = build_context(activity, goals)
+    manifest.record(activity_id, STAGE, inputs)
+    return True
+
+
 def main() -> None:
     goals = load_json(GOALS_PATH)
-    activity_paths = sorted(ACTIVITIES_DIR.glob("*.json"))
-    for path in activity_paths:
-        payload = load_json(path)
-        activity = payload.get("activity") or {}
-        if payload.get("activity_context") is None:
-            payload["activity_context"] = build_context(activity, goals)
-        write_json(path, payload)
+    manifest = Manifest.load(MANIFEST_PATH)
+    goals_digest = manifest.file_digest(GOALS_PATH)
+    store = JsonStore(ACTIVITIES_DIR)
+    for activity_id in store.ids():
+        payload = store.load(activity_id)
+        if refresh_context(activity_id, payload, manifest, goals, goals_digest):
+            store.save(activity_id, payload, SECTIONS)
+    manifest.save()
 
 
 if __name__ == "__main__":
@@ -1,20 +1,30 @@
 from __future__ import annotations
 
+import argparse
 import inspect
 import os
 import random
+import sys
 from dataclasses import dataclass
+from functools import cache
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any, Callable
 
 import polyline
-import yaml
-from crewai import Agent, Crew, LLM, Task
-from geopy.geocoders import Nominatim
 
-from scripts.utils import load_env, load_json, parse_iso
+from scripts.locks import LeaseLost, claim
+from scripts.manifest import Manifest, digest_value
+from scripts.profiling import Profiler, add_profile_arguments
+from scripts.store import open_store
+from scripts.utils import atomic_output, load_env, parse_iso
 
-load_env(Path("api-keys/ollama.env"))
+# crewai, geopy and yaml take seconds to import, so they are imported where
+# used and a run with nothing to describe never loads them.
+if TYPE_CHECKING:
+    from crewai import LLM, Agent, Task
+    from geopy.geocoders import Nominatim
+
+API_KEYS_PATH = Path("api-keys/ollama.env")
 
 OLLAMA_CLOUD_MODELS = [
     "gemini-3-flash-preview",
@@ -32,6 +42,11 @@ ACTIVITIES_DIR = DATA_DIR / "activities"
 DESCRIPTIONS_DIR = DATA_DIR / "descriptions"
 PROMPTS_DIR = Path("prompts")
 ACTIVITY_CONTEXT_PATH = PROMPTS_DIR / "activity-context.txt"
+MANIFEST_PATH = DATA_DIR / "manifest.json"
+LOCKS_DIR = DATA_DIR / "locks"
+PROFILE_PATH = DATA_DIR / "profile-describe.json"
+STAGE = "describe"
+DESCRIBE_PAYLOAD_KEYS = ["activity", "weather", "traffic", "uniqueness", "activity_context", "geo"]
 PROMPT_INPUT_KEYS = [
     "distance_context",
     "moving_time_context",
@@ -190,6 +205,8 @@ def prompt_inputs(payload: dict) -> dict:
     activity_context = payload["activity_context"]
     points_of_interest = ", ".join(payload["geo"]["points_of_interest"])
 
+    from geopy.geocoders import Nominatim
+
     # Reverse geocode the midpoint of the route for location context.
     geolocator = Nominatim(user_agent="strava-activity-description")
     city, country = location_from_polyline(activity["map"]["polyline"], geolocator)
@@ -220,6 +237,8 @@ def load_yaml_config(path: Path) -> dict[str, Any]:
     """Load YAML config files for CrewAI agents/tasks."""
     if not path.exists():
         raise FileNotFoundError(f"Missing CrewAI config: {path}")
+    import yaml
+
     content = path.read_text(encoding="utf-8")
     data = yaml.safe_load(content)
     return data or {}
@@ -251,7 +270,14 @@ def to_single_line(text: str) -> str:
     return " ".join(text.splitlines())
 
 
+@cache
+def load_api_keys() -> None:
+    """Load the Ollama keys once, on first use rather than at import."""
+    load_env(API_KEYS_PATH)
+
+
 def resolve_ollama_endpoint(model: str) -> tuple[str, str, str | None]:
+    load_api_keys()
     model_name = model if "/" in model else f"ollama/{model}"
     if model in OLLAMA_CLOUD_MODELS:
         api_key = os.getenv("OLLAMA_API_KEY") or os.getenv("API_KEY")
@@ -265,6 +291,8 @@ def resolve_ollama_endpoint(model: str) -> tuple[str, str, str | None]:
 
 
 def build_llm(model: str) -> LLM:
+    from crewai import LLM
+
     model_name, base_url, api_key = resolve_ollama_endpoint(model)
 
     # CrewAI's LLM signature changes across versions; only pass supported args.
@@ -288,12 +316,16 @@ def build_llm(model: str) -> LLM:
 
 
 def build_agent(agent_config: dict[str, Any], llm: LLM) -> Agent:
+    from crewai import Agent
+
     config = dict(agent_config)
     config["llm"] = llm
     return Agent(**config)
 
 
 def build_task(task_config: dict[str, Any], agent: Agent) -> Task:
+    from crewai import Task
+
     config = dict(task_config)
     config.pop("agent", None)
     return Task(agent=agent, **config)
@@ -309,6 +341,8 @@ def extract_result_text(result: Any) -> str:
 
 
 def run_crewai_task(agent: Agent, task_config: dict[str, Any], inputs: dict[str, Any]) -> str:
+    from crewai import Crew
+
     task = build_task(task_config, agent)
     crew = Crew(agents=[agent], tasks=[task])
     result = crew.kickoff(inputs=inputs)
@@ -320,7 +354,9 @@ def run_prompt_pipeline(
     tasks_config: list[tuple[str, dict[str, Any]]],
     model: str,
     inputs: dict[str, Any],
+    renew: Callable[[], None] | None = None,
 ) -> str:
+    """Run the tasks in order, calling renew (if given) before each crew."""
     llm = build_llm(model)
     agents = {name: build_agent(config, llm) for name, config in agents_config.items()}
     task_inputs = dict(inputs)
@@ -333,6 +369,8 @@ def run_prompt_pipeline(
             raise ValueError(
                 f"Task {task_name} expects agent {agent_name}, which is missing."
             )
+        if renew is not None:
+            renew()
         output = run_crewai_task(agents[agent_name], task_config, task_inputs)
         last_output = output
         task_inputs["draft_description"] = output
@@ -360,6 +398,7 @@ def load_prompt_config(
 def build_markdown(
     activity_id: str,
     inputs: dict,
+    renew: Callable[[], None] | None = None,
 ) -> str:
     lines = [f"# {activity_id}", ""]
     activity_context = render_activity_context(inputs)
@@ -374,7 +413,7 @@ def build_markdown(
         lines.append(f"## {prompt_config.label}")
         for model in OLLAMA_MODELS:
             crew_output = run_prompt_pipeline(
-                agents_config, tasks_config, model, task_inputs
+                agents_config, tasks_config, model, task_inputs, renew
             )
             ollama_output = to_single_line(crew_output)
             print(f"{prompt_config.label} - {model}")
@@ -385,19 +424,68 @@ def build_markdown(
     return "\n".join(lines).rstrip() + "\n"
 
 
-def main() -> None:
+def prompt_paths() -> list[Path]:
+    paths = [ACTIVITY_CONTEXT_PATH]
+    for prompt_config in PROMPT_CONFIGS:
+        paths.extend([prompt_config.agents_path, prompt_config.tasks_path])
+    return paths
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate activity descriptions.")
+    parser.add_argument(
+        "--store",
+        type=Path,
+        default=ACTIVITIES_DIR,
+        help="activity store: a JSON directory or a .sqlite file (default: %(default)s)",
+    )
+    add_profile_arguments(parser, PROFILE_PATH)
+    args = parser.parse_args(argv)
+    profiler = Profiler(enabled=args.profile is not None, pstats_dir=args.pstats)
+    store = open_store(args.store)
+
     DESCRIPTIONS_DIR.mkdir(parents=True, exist_ok=True)
-    for activity_path in sorted(ACTIVITIES_DIR.glob("*.json")):
-        activity_id = activity_path.stem
-        output_path = DESCRIPTIONS_DIR / f"{activity_id}.md"
-        if output_path.exists():
-            continue
-        payload = load_json(activity_path)
-        inputs = prompt_inputs(payload)
-        output_path.write_text(
-            build_markdown(activity_id, inputs),
-            encoding="utf-8",
-        )
+    manifest = Manifest.load(MANIFEST_PATH)
+    prompts_digest = manifest.files_digest(prompt_paths())
+    with profiler.stage(STAGE):
+        for activity_id in store.ids():
+            output_path = DESCRIPTIONS_DIR / f"{activity_id}.md"
+            payload = store.load(activity_id, DESCRIBE_PAYLOAD_KEYS)
+            stage_inputs = {
+                "prompts": prompts_digest,
+                "payload": digest_value({key: payload.get(key) for key in DESCRIBE_PAYLOAD_KEYS}),
+            }
+            if not manifest.is_stale(activity_id, STAGE, stage_inputs, output_path.exists()):
+                continue
+            # Another describe process may be generating this one right now.
+            lease = claim(LOCKS_DIR, f"{STAGE}-{activity_id}")
+            if lease is None:
+                continue
+            with lease:
+                # ...or may have finished it since our manifest was loaded.
+                manifest.sync()
+                if not manifest.is_stale(activity_id, STAGE, stage_inputs, output_path.exists()):
+                    continue
+                try:
+                    with profiler.activity(STAGE, activity_id):
+                        inputs = prompt_inputs(payload)
+                        # Renewed before every LLM call, so slow runs keep their claim.
+                        markdown = build_markdown(activity_id, inputs, lease.renew)
+                except LeaseLost:
+                    print(
+                        f"lease on {activity_id} expired and was taken over; skipping",
+                        file=sys.stderr,
+                    )
+                    continue
+                with atomic_output(output_path) as tmp_path:
+                    tmp_path.write_text(markdown, encoding="utf-8")
+                manifest.record(activity_id, STAGE, stage_inputs)
+                # Descriptions are slow to generate, so persist progress per activity.
+                manifest.save()
+    manifest.save()
+    store.close()
+    if args.profile is not None:
+        profiler.write(args.profile)
 
 
 if __name__ == "__main__":
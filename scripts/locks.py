@@ -0,0 +1,124 @@
+"""Advisory file locks and expiring work leases for processes sharing data/.
+
+file_lock serializes short read-modify-write sections (a payload save, a
+manifest merge) with fcntl.flock, which Linux also honours on NFS. Leases
+claim long-running work (an LLM description) for one process: the lease
+file is created with O_CREAT | O_EXCL, so exactly one claimer wins, and a
+lease whose holder died is taken over once it expires. Holders renew the
+lease as the work progresses. Expiry compares wall clocks, so machines
+sharing a lease directory need synchronized time.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+LEASE_SECONDS = 30 * 60
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive advisory lock on path (created if missing) for the block."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def owner_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseLost(RuntimeError):
+    """The lease expired and another process took it over."""
+
+
+class Lease:
+    """A claimed lease file; renew it while working and release it when done."""
+
+    def __init__(self, path: Path, owner: str) -> None:
+        self.path = path
+        self.owner = owner
+
+    def renew(self, seconds: float = LEASE_SECONDS) -> None:
+        """Push the expiry seconds from now, or raise LeaseLost if another process holds it."""
+        with file_lock(self.path.with_suffix(".lock")):
+            holder = read_lease(self.path)
+            if holder is None or holder.get("owner") != self.owner:
+                raise LeaseLost(self.path.name)
+            _write(self.path, self.owner, seconds)
+
+    def release(self) -> None:
+        """Delete the lease if this process still holds it."""
+        with file_lock(self.path.with_suffix(".lock")):
+            holder = read_lease(self.path)
+            if holder is not None and holder.get("owner") == self.owner:
+                self.path.unlink(missing_ok=True)
+
+    def __enter__(self) -> Lease:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+def read_lease(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        # Being written by its creator right now, or left partial by a crash:
+        # held until a full lease period after it was created.
+        try:
+            created = path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        return {"owner": None, "expires": created + LEASE_SECONDS}
+
+
+def _write(path: Path, owner: str, seconds: float) -> None:
+    """Replace an existing lease atomically, so readers never see a partial one."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(
+        json.dumps({"owner": owner, "expires": time.time() + seconds}), encoding="utf-8"
+    )
+    os.replace(tmp_path, path)
+
+
+def _create(path: Path, owner: str, seconds: float) -> bool:
+    try:
+        descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(descriptor, "w", encoding="utf-8") as handle:
+        json.dump({"owner": owner, "expires": time.time() + seconds}, handle)
+    return True
+
+
+def claim(directory: Path, key: str, seconds: float = LEASE_SECONDS) -> Lease | None:
+    """Claim key for seconds, or return None while another process holds it."""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{key}.lease"
+    owner = owner_name()
+    if _create(path, owner, seconds):
+        return Lease(path, owner)
+    # Take over an expired lease under a lock, so only one process breaks it.
+    with file_lock(path.with_suffix(".lock")):
+        holder = read_lease(path)
+        if holder is not None and holder["expires"] > time.time():
+            return None
+        path.unlink(missing_ok=True)
+        if _create(path, owner, seconds):
+            return Lease(path, owner)
+    return None
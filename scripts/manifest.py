@@ -0,0 +1,124 @@
+"""Track the input hashes each (activity, stage) output was built from."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Iterable
+
+from scripts.locks import file_lock
+from scripts.utils import load_json, write_json
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def digest_value(value: object) -> str:
+    """Hash a JSON-serializable value independently of key order."""
+    text = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=True)
+    return digest_bytes(text.encode("utf-8"))
+
+
+def _stamp(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Manifest:
+    """Per-activity, per-stage input digests plus a file digest cache.
+
+    A stage is stale for an activity when the digests of its current inputs
+    differ from the ones recorded when its output was last written. Several
+    processes may share one manifest file: save and sync merge with it under
+    a lock, and records made here since the last save win.
+    """
+
+    def __init__(self, path: Path, data: dict | None = None) -> None:
+        data = data or {}
+        self.path = path
+        self.files: dict[str, dict] = data.get("files", {})
+        self.activities: dict[str, dict[str, dict[str, str]]] = data.get("activities", {})
+        self._recorded: set[tuple[str, str]] = set()
+        self._stamp: tuple[int, int] | None = None
+
+    @classmethod
+    def load(cls, path: Path) -> Manifest:
+        stamp = _stamp(path)
+        if stamp is None:
+            return cls(path)
+        manifest = cls(path, load_json(path))
+        manifest._stamp = stamp
+        return manifest
+
+    def file_digest(self, path: Path) -> str:
+        """Hash a file's contents, reusing the cached digest while mtime and size match."""
+        stat = path.stat()
+        key = str(path)
+        entry = self.files.get(key)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["sha256"]
+        with path.open("rb") as handle:
+            digest = hashlib.file_digest(handle, "sha256").hexdigest()
+        self.files[key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest}
+        return digest
+
+    def files_digest(self, paths: Iterable[Path]) -> str:
+        """Hash a set of files by name and content."""
+        return digest_value(sorted((str(path), self.file_digest(path)) for path in paths))
+
+    def inputs(self, activity_id: str, stage: str) -> dict[str, str] | None:
+        return self.activities.get(activity_id, {}).get(stage)
+
+    def is_stale(
+        self, activity_id: str, stage: str, inputs: dict[str, str], has_output: bool
+    ) -> bool:
+        """Return True when the stage must be recomputed for this activity.
+
+        Outputs written before the manifest existed have no record; they are
+        adopted as fresh with the current inputs instead of being recomputed.
+        """
+        recorded = self.inputs(activity_id, stage)
+        if recorded is None:
+            if has_output:
+                self.record(activity_id, stage, inputs)
+                return False
+            return True
+        return recorded != inputs
+
+    def record(self, activity_id: str, stage: str, inputs: dict[str, str]) -> None:
+        self.activities.setdefault(activity_id, {})[stage] = dict(inputs)
+        self._recorded.add((activity_id, stage))
+
+    def _merge_from_disk(self) -> None:
+        stamp = _stamp(self.path)
+        if stamp is None or stamp == self._stamp:
+            # Nobody else wrote the file since we last read or wrote it.
+            return
+        data = load_json(self.path)
+        self.files = {**data.get("files", {}), **self.files}
+        activities = data.get("activities", {})
+        for activity_id, stage in self._recorded:
+            activities.setdefault(activity_id, {})[stage] = self.activities[activity_id][stage]
+        self.activities = activities
+        self._stamp = stamp
+
+    def sync(self) -> None:
+        """Pick up records other processes saved, keeping unsaved local ones."""
+        with file_lock(self.lock_path()):
+            self._merge_from_disk()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.lock_path()):
+            self._merge_from_disk()
+            write_json(self.path, {"files": self.files, "activities": self.activities})
+            self._stamp = _stamp(self.path)
+        self._recorded.clear()
+
+    def lock_path(self) -> Path:
+        return self.path.with_name(f"{self.path.name}.lock")
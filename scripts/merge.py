@@ -2,17 +2,32 @@
 
 from __future__ import annotations
 
+import argparse
+import sys
 import uuid
 import xml.etree.ElementTree as ET
-from dataclasses import dataclass
-from datetime import datetime, timezone
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from scripts.manifest import Manifest
+from scripts.utils import atomic_output, load_json, write_json
 
 RAW_DIR = Path("data/raw")
 OUT_DIR = Path("data/gpx")
+INDEX_PATH = Path("data/raw-index.json")
+MANIFEST_PATH = Path("data/manifest.json")
+STAGE = "merge"
 
 GPX_NS = "http://www.topografix.com/GPX/1/1"
 GPXTPX_NS = "http://www.garmin.com/xmlschemas/TrackPointExtension/v1"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MISSING = -1
 
 
 @dataclass
@@ -22,6 +37,23 @@ class GpxPoint:
     ele: str | None
     time: str
     time_key: str
+    epoch_ms: int = field(default=0, compare=False, repr=False)
+
+
+@dataclass
+class TcxSamples:
+    """Columnar TCX samples; missing heart rate/cadence values are MISSING."""
+
+    epoch_ms: np.ndarray
+    hr: np.ndarray
+    cad: np.ndarray
+
+
+@dataclass
+class MergeTask:
+    tcx_file: Path
+    output_path: Path
+    candidates: list[Path]
 
 
 def parse_time(value: str | None) -> datetime | None:
@@ -37,26 +69,61 @@ def time_key(dt: datetime) -> str:
     return dt.replace(microsecond=0).isoformat().replace("+00:00", "Z")
 
 
+def epoch_ms(dt: datetime) -> int:
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+
 def list_files(directory: Path, suffix: str) -> list[Path]:
     return sorted(p for p in directory.iterdir() if p.suffix.lower() == suffix)
 
 
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def iter_elements(path: Path, name: str) -> Iterator[ET.Element]:
+    """Stream elements by local tag name, dropping each one once consumed.
+
+    Matched elements are detached from their parent after the caller has
+    handled them, so memory stays flat regardless of track length.
+    """
+    parents: list[ET.Element] = []
+    for event, element in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        if _local_name(element.tag) != name:
+            continue
+        yield element
+        element.clear()
+        if parents:
+            parents[-1].remove(element)
+
+
+def _parse_tcx_sample(tp: ET.Element) -> tuple[datetime, int | None, int | None] | None:
+    time_el = tp.find("{*}Time")
+    dt = parse_time(time_el.text if time_el is not None else None)
+    if not dt:
+        return None
+    hr_el = tp.find(".//{*}HeartRateBpm/{*}Value")
+    cad_el = tp.find("{*}Cadence")
+    hr = int(hr_el.text) if hr_el is not None and hr_el.text else None
+    cad = int(cad_el.text) if cad_el is not None and cad_el.text else None
+    return dt, hr, cad
+
+
+def iter_tcx_samples(path: Path) -> Iterator[tuple[datetime, int | None, int | None]]:
+    """Yield (time, heart_rate, cadence) per TCX trackpoint."""
+    for tp in iter_elements(path, "Trackpoint"):
+        sample = _parse_tcx_sample(tp)
+        if sample:
+            yield sample
+
+
 def parse_tcx(path: Path) -> dict[str, tuple[int | None, int | None]]:
     """Map timestamp -> (heart_rate, cadence)."""
-    tree = ET.parse(path)
-    root = tree.getroot()
-    data: dict[str, tuple[int | None, int | None]] = {}
-    for tp in root.findall(".//{*}Trackpoint"):
-        time_el = tp.find("{*}Time")
-        dt = parse_time(time_el.text if time_el is not None else None)
-        if not dt:
-            continue
-        hr_el = tp.find(".//{*}HeartRateBpm/{*}Value")
-        cad_el = tp.find("{*}Cadence")
-        hr = int(hr_el.text) if hr_el is not None and hr_el.text else None
-        cad = int(cad_el.text) if cad_el is not None and cad_el.text else None
-        data[time_key(dt)] = (hr, cad)
-    return data
+    return {time_key(dt): (hr, cad) for dt, hr, cad in iter_tcx_samples(path)}
 
 
 def _parse_gpx_point(trkpt: ET.Element) -> GpxPoint | None:
@@ -72,97 +139,467 @@ def _parse_gpx_point(trkpt: ET.Element) -> GpxPoint | None:
         ele=(ele_el.text if ele_el is not None else None),
         time=tk,
         time_key=tk,
+        epoch_ms=epoch_ms(dt),
     )
 
 
-def parse_gpx(path: Path) -> list[GpxPoint]:
-    """Parse GPX trackpoints into GpxPoint records."""
-    tree = ET.parse(path)
-    root = tree.getroot()
-    points: list[GpxPoint] = []
-    for trkpt in root.findall(".//{*}trkpt"):
+def iter_gpx_points(path: Path) -> Iterator[GpxPoint]:
+    """Yield GpxPoint records as GPX trackpoints are parsed."""
+    for trkpt in iter_elements(path, "trkpt"):
         point = _parse_gpx_point(trkpt)
         if point:
-            points.append(point)
-    return points
+            yield point
+
+
+def parse_gpx(path: Path) -> list[GpxPoint]:
+    """Parse GPX trackpoints into GpxPoint records."""
+    return list(iter_gpx_points(path))
 
 
-def load_gpx(path: Path) -> tuple[list[GpxPoint], set[str]]:
+def load_tcx(path: Path) -> TcxSamples:
+    """Parse TCX samples into int64 epoch/heart-rate/cadence arrays."""
+    times: list[int] = []
+    hrs: list[int] = []
+    cads: list[int] = []
+    for dt, hr, cad in iter_tcx_samples(path):
+        times.append(epoch_ms(dt))
+        hrs.append(MISSING if hr is None else hr)
+        cads.append(MISSING if cad is None else cad)
+    return TcxSamples(
+        epoch_ms=np.array(times, dtype=np.int64),
+        hr=np.array(hrs, dtype=np.int64),
+        cad=np.array(cads, dtype=np.int64),
+    )
+
+
+def load_gpx(path: Path) -> tuple[list[GpxPoint], np.ndarray]:
     points = parse_gpx(path)
-    return points, {point.time_key for point in points}
+    return points, np.fromiter((point.epoch_ms for point in points), np.int64, len(points))
+
+
+def join_indices(gpx_ms: np.ndarray, tcx_ms: np.ndarray, tolerance_ms: int = 0) -> np.ndarray:
+    """Return the matching TCX sample index for each GPX timestamp, or -1.
+
+    With no tolerance, timestamps match on the same whole second and the last
+    TCX sample in that second wins. Otherwise each GPX timestamp takes the
+    nearest TCX sample within tolerance_ms.
+    """
+    result = np.full(gpx_ms.shape, -1, dtype=np.int64)
+    if gpx_ms.size == 0 or tcx_ms.size == 0:
+        return result
+    if tolerance_ms <= 0:
+        gpx_keys = gpx_ms // 1000
+        tcx_keys = tcx_ms // 1000
+        order = np.argsort(tcx_keys, kind="stable")
+        sorted_keys = tcx_keys[order]
+        pos = np.searchsorted(sorted_keys, gpx_keys, side="right") - 1
+        clipped = np.clip(pos, 0, None)
+        hit = (pos >= 0) & (sorted_keys[clipped] == gpx_keys)
+        result[hit] = order[clipped[hit]]
+        return result
 
+    order = np.argsort(tcx_ms, kind="stable")
+    sorted_ms = tcx_ms[order]
+    right = np.clip(np.searchsorted(sorted_ms, gpx_ms, side="left"), 0, sorted_ms.size - 1)
+    left = np.clip(right - 1, 0, None)
+    left_gap = np.abs(gpx_ms - sorted_ms[left])
+    right_gap = np.abs(sorted_ms[right] - gpx_ms)
+    nearest = np.where(right_gap < left_gap, right, left)
+    gap = np.minimum(left_gap, right_gap)
+    hit = gap <= tolerance_ms
+    result[hit] = order[nearest[hit]]
+    return result
 
-def write_gpx(points: list[GpxPoint], tcx_data: dict[str, tuple[int | None, int | None]], output: Path) -> None:
-    """Write merged GPX with cadence/HR trackpoint extensions."""
-    ET.register_namespace("", GPX_NS)
-    ET.register_namespace("gpxtpx", GPXTPX_NS)
 
-    gpx = ET.Element(
-        "{http://www.topografix.com/GPX/1/1}gpx",
-        {
-            "version": "1.1",
-            "creator": "merge_tcx_gpx",
-        },
+def _escape_text(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _escape_attrib(text: str) -> str:
+    return (
+        _escape_text(text)
+        .replace('"', "&quot;")
+        .replace("\r", "&#13;")
+        .replace("\n", "&#10;")
+        .replace("\t", "&#09;")
     )
-    trk = ET.SubElement(gpx, "{http://www.topografix.com/GPX/1/1}trk")
-    seg = ET.SubElement(trk, "{http://www.topografix.com/GPX/1/1}trkseg")
-
-    for point in points:
-        trkpt = ET.SubElement(
-            seg,
-            "{http://www.topografix.com/GPX/1/1}trkpt",
-            {"lat": point.lat, "lon": point.lon},
-        )
-        if point.ele is not None:
-            ET.SubElement(trkpt, "{http://www.topografix.com/GPX/1/1}ele").text = point.ele
-        ET.SubElement(trkpt, "{http://www.topografix.com/GPX/1/1}time").text = point.time
 
-        hr, cad = tcx_data.get(point.time_key, (None, None))
-        if hr is not None or cad is not None:
-            ext = ET.SubElement(trkpt, "{http://www.topografix.com/GPX/1/1}extensions")
-            tpe = ET.SubElement(ext, f"{{{GPXTPX_NS}}}TrackPointExtension")
-            if hr is not None:
-                ET.SubElement(tpe, f"{{{GPXTPX_NS}}}hr").text = str(hr)
-            if cad is not None:
-                ET.SubElement(tpe, f"{{{GPXTPX_NS}}}cad").text = str(cad)
 
-    tree = ET.ElementTree(gpx)
-    ET.indent(tree, space="  ")
-    tree.write(output, encoding="utf-8", xml_declaration=True)
+def _text_element(indent: str, tag: str, text: str) -> str:
+    if not text:
+        return f"{indent}<{tag} />\n"
+    return f"{indent}<{tag}>{_escape_text(text)}</{tag}>\n"
 
 
-def main() -> None:
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
-    tcx_files = list_files(RAW_DIR, ".tcx")
-    gpx_files = list_files(RAW_DIR, ".gpx")
-    gpx_cache: dict[Path, tuple[list[GpxPoint], set[str]]] = {}
-    for tcx_file in tcx_files:
-        output_id = uuid.uuid5(uuid.NAMESPACE_URL, tcx_file.name)
-        output_path = OUT_DIR / f"{output_id}.gpx"
-        if output_path.exists():
+def write_gpx(
+    points: list[GpxPoint], tcx_data: dict[str, tuple[int | None, int | None]], output: Path
+) -> None:
+    """Write merged GPX with cadence/HR trackpoint extensions.
+
+    Trackpoints are streamed one at a time to a temporary file that replaces
+    output once complete, so an interrupted merge never leaves a truncated
+    GPX. The output is byte-identical to building the tree with ElementTree,
+    running ET.indent and writing it with an XML declaration.
+    """
+    samples = [tcx_data.get(point.time_key, (None, None)) for point in points]
+    has_extensions = any(hr is not None or cad is not None for hr, cad in samples)
+    # ElementTree only declares the extension namespace when it is used.
+    namespaces = f' xmlns="{GPX_NS}"'
+    if has_extensions:
+        namespaces += f' xmlns:gpxtpx="{GPXTPX_NS}"'
+
+    with atomic_output(output) as tmp_path, tmp_path.open(
+        "w", encoding="utf-8", errors="xmlcharrefreplace", buffering=1 << 16
+    ) as handle:
+        write = handle.write
+        write("<?xml version='1.0' encoding='utf-8'?>\n")
+        write(f'<gpx{namespaces} version="1.1" creator="merge_tcx_gpx">\n')
+        write("  <trk>\n")
+        if not points:
+            write("    <trkseg />\n")
+        else:
+            write("    <trkseg>\n")
+            for point, (hr, cad) in zip(points, samples):
+                lat, lon = _escape_attrib(point.lat), _escape_attrib(point.lon)
+                write(f'      <trkpt lat="{lat}" lon="{lon}">\n')
+                if point.ele is not None:
+                    write(_text_element("        ", "ele", point.ele))
+                write(_text_element("        ", "time", point.time))
+                if hr is not None or cad is not None:
+                    write("        <extensions>\n")
+                    write("          <gpxtpx:TrackPointExtension>\n")
+                    if hr is not None:
+                        write(_text_element("            ", "gpxtpx:hr", str(hr)))
+                    if cad is not None:
+                        write(_text_element("            ", "gpxtpx:cad", str(cad)))
+                    write("          </gpxtpx:TrackPointExtension>\n")
+                    write("        </extensions>\n")
+                write("      </trkpt>\n")
+            write("    </trkseg>\n")
+        write("  </trk>\n")
+        write("</gpx>")
+
+
+def iter_time_keys(path: Path) -> Iterator[str]:
+    if path.suffix.lower() == ".tcx":
+        return (time_key(dt) for dt, _, _ in iter_tcx_samples(path))
+    return (point.time_key for point in iter_gpx_points(path))
+
+
+def time_range(path: Path) -> tuple[str, str] | None:
+    """Return the (start, end) time keys covered by a raw file."""
+    start: str | None = None
+    end: str | None = None
+    for key in iter_time_keys(path):
+        if start is None or key < start:
+            start = key
+        if end is None or key > end:
+            end = key
+    if start is None or end is None:
+        return None
+    return start, end
+
+
+def load_time_index(path: Path) -> dict[str, dict]:
+    if not path.exists():
+        return {}
+    return load_json(path)
+
+
+def indexed_time_range(index: dict[str, dict], path: Path) -> tuple[str, str] | None:
+    """Look up a file's time range, re-scanning it when mtime or size changed."""
+    stat = path.stat()
+    entry = index.get(path.name)
+    if (
+        entry is None
+        or entry["mtime_ns"] != stat.st_mtime_ns
+        or entry["size"] != stat.st_size
+    ):
+        span = time_range(path)
+        entry = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "start": span[0] if span else None,
+            "end": span[1] if span else None,
+        }
+        index[path.name] = entry
+    if entry["start"] is None:
+        return None
+    return entry["start"], entry["end"]
+
+
+def overlapping_files(
+    span: tuple[str, str], ranges: list[tuple[str, str, Path]]
+) -> list[Path]:
+    """Return files whose range overlaps span; ranges must be sorted by start."""
+    start, end = span
+    cutoff = bisect_right(ranges, end, key=lambda item: item[0])
+    return sorted(path for range_start, range_end, path in ranges[:cutoff] if range_end >= start)
+
+
+def gpx_time_ranges(
+    gpx_files: list[Path], index: dict[str, dict]
+) -> list[tuple[str, str, Path]]:
+    """(start, end, path) of every indexable GPX file, sorted by start."""
+    ranges = []
+    for gpx_file in gpx_files:
+        try:
+            span = indexed_time_range(index, gpx_file)
+        except Exception:
+            # plan_groups reports the file when a TCX needs it.
             continue
-        tcx_data = parse_tcx(tcx_file)
-        tcx_keys = set(tcx_data)
-        match_file: Path | None = None
-        match_points: list[GpxPoint] = []
-        for gpx_file in gpx_files:
-            if gpx_file not in gpx_cache:
-                points, keys = load_gpx(gpx_file)
-                gpx_cache[gpx_file] = (points, keys)
-            else:
-                points, keys = gpx_cache[gpx_file]
-            # First GPX file sharing timestamps with the TCX wins.
-            if tcx_keys & keys:
-                match_file = gpx_file
-                match_points = points
-                break
-        if match_file is None:
+        if span:
+            ranges.append((span[0], span[1], gpx_file))
+    return sorted(ranges)
+
+
+def output_path_for(tcx_file: Path, out_dir: Path) -> Path:
+    output_id = uuid.uuid5(uuid.NAMESPACE_URL, tcx_file.name)
+    return out_dir / f"{output_id}.gpx"
+
+
+def plan_groups(
+    tcx_files: list[Path], gpx_files: list[Path], index: dict[str, dict], out_dir: Path
+) -> tuple[list[list[MergeTask]], list[tuple[Path, str]]]:
+    """Group pending TCX files that compete for the same candidate GPX files.
+
+    Groups share no GPX files, so they can be merged independently while the
+    first-match-wins rule still holds inside each group. Files that cannot be
+    indexed are returned as (path, error) failures.
+    """
+    failures: list[tuple[Path, str]] = []
+
+    def safe_time_range(path: Path) -> tuple[str, str] | None:
+        try:
+            return indexed_time_range(index, path)
+        except Exception as exc:
+            failures.append((path, f"{type(exc).__name__}: {exc}"))
+            return None
+
+    gpx_ranges: list[tuple[str, str, Path]] = []
+    for gpx_file in gpx_files:
+        span = safe_time_range(gpx_file)
+        if span:
+            gpx_ranges.append((span[0], span[1], gpx_file))
+    gpx_ranges.sort()
+
+    groups: list[list[MergeTask]] = []
+    owner: dict[Path, int] = {}
+    for tcx_file in tcx_files:
+        output_path = output_path_for(tcx_file, out_dir)
+        span = safe_time_range(tcx_file)
+        if span is None:
             continue
-        gpx_files.remove(match_file)
-        gpx_points = [pt for pt in match_points if pt.time_key in tcx_data]
-        if not gpx_points:
+        candidates = overlapping_files(span, gpx_ranges)
+        if not candidates:
             continue
-        write_gpx(gpx_points, tcx_data, output_path)
+        merged = sorted({owner[path] for path in candidates if path in owner})
+        group = [MergeTask(tcx_file, output_path, candidates)]
+        for group_id in merged:
+            group.extend(groups[group_id])
+            groups[group_id] = []
+        group.sort(key=lambda task: task.tcx_file)
+        groups.append(group)
+        for task in group:
+            for path in task.candidates:
+                owner[path] = len(groups) - 1
+    return [group for group in groups if group], failures
+
+
+def merge_group(
+    group: list[MergeTask], tolerance_ms: int = 0
+) -> tuple[list[tuple[Path, Path]], list[tuple[Path, str]]]:
+    """Merge each TCX in a group with its first matching unused GPX file.
+
+    Returns the (tcx_file, gpx_file) pairs written and (tcx_file, error) pairs
+    for TCX files that failed to merge.
+    """
+    merged: list[tuple[Path, Path]] = []
+    failures: list[tuple[Path, str]] = []
+    used: set[Path] = set()
+    gpx_cache: dict[Path, tuple[list[GpxPoint], np.ndarray]] = {}
+    for task in group:
+        try:
+            samples = load_tcx(task.tcx_file)
+            match_file: Path | None = None
+            match_points: list[GpxPoint] = []
+            indices = np.array([], dtype=np.int64)
+            for gpx_file in task.candidates:
+                if gpx_file in used:
+                    continue
+                if gpx_file not in gpx_cache:
+                    gpx_cache[gpx_file] = load_gpx(gpx_file)
+                points, gpx_ms = gpx_cache[gpx_file]
+                indices = join_indices(gpx_ms, samples.epoch_ms, tolerance_ms)
+                # First GPX file sharing timestamps with the TCX wins.
+                if (indices >= 0).any():
+                    match_file = gpx_file
+                    match_points = points
+                    break
+            if match_file is None:
+                continue
+            used.add(match_file)
+            gpx_cache.pop(match_file)
+            matched = np.flatnonzero(indices >= 0)
+            sample_ids = indices[matched]
+            hrs = samples.hr[sample_ids].tolist()
+            cads = samples.cad[sample_ids].tolist()
+            gpx_points = [match_points[i] for i in matched.tolist()]
+            tcx_data = {
+                point.time_key: (
+                    None if hr == MISSING else hr,
+                    None if cad == MISSING else cad,
+                )
+                for point, hr, cad in zip(gpx_points, hrs, cads)
+            }
+            write_gpx(gpx_points, tcx_data, task.output_path)
+            merged.append((task.tcx_file, match_file))
+        except Exception as exc:
+            failures.append((task.tcx_file, f"{type(exc).__name__}: {exc}"))
+    return merged, failures
+
+
+def run_groups(
+    groups: list[list[MergeTask]], jobs: int, tolerance_ms: int = 0
+) -> tuple[list[tuple[Path, Path]], list[tuple[Path, str]]]:
+    """Merge groups serially or across a process pool, collecting results."""
+    if jobs <= 1 or len(groups) <= 1:
+        results = [merge_group(group, tolerance_ms) for group in groups]
+    else:
+        results = []
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(merge_group, group, tolerance_ms) for group in groups]
+            for group, future in zip(groups, futures):
+                try:
+                    results.append(future.result())
+                except Exception as exc:  # e.g. a worker process crashed
+                    error = f"{type(exc).__name__}: {exc}"
+                    results.append(([], [(task.tcx_file, error) for task in group]))
+    merged = [pair for pairs, _ in results for pair in pairs]
+    failures = [failure for _, group_failures in results for failure in group_failures]
+    return merged, failures
+
+
+def merge_inputs(
+    manifest: Manifest, tcx_file: Path, gpx_file: Path, tolerance_ms: int
+) -> dict[str, str]:
+    return {
+        "tcx": manifest.file_digest(tcx_file),
+        "gpx_file": gpx_file.name,
+        "gpx": manifest.file_digest(gpx_file),
+        "tolerance_ms": str(tolerance_ms),
+    }
+
+
+def gpx_is_complete(path: Path) -> bool:
+    """True when path exists and ends with the closing </gpx> tag.
+
+    Every writer ends the file with it, so a merge interrupted mid-stream by
+    a writer that predates the atomic one fails this check. Only the tail is
+    read, which keeps the check cheap on every run.
+    """
+    try:
+        with path.open("rb") as handle:
+            size = handle.seek(0, 2)
+            handle.seek(max(0, size - 64))
+            return handle.read().rstrip().endswith(b"</gpx>")
+    except FileNotFoundError:
+        return False
+
+
+def source_gpx(output_path: Path, gpx_ranges: list[tuple[str, str, Path]]) -> Path | None:
+    """The first raw GPX whose time range covers a merged output; ranges sorted by start."""
+    span = time_range(output_path)
+    if span is None:
+        return None
+    cutoff = bisect_right(gpx_ranges, span[0], key=lambda item: item[0])
+    return min((path for _, end, path in gpx_ranges[:cutoff] if end >= span[1]), default=None)
+
+
+def merge_is_stale(
+    manifest: Manifest,
+    tcx_file: Path,
+    output_path: Path,
+    tolerance_ms: int,
+    gpx_ranges: list[tuple[str, str, Path]] = (),
+) -> bool:
+    """Check a TCX against the raw files its merged GPX was built from.
+
+    Outputs merged before the manifest existed have no record. A truncated
+    one is merged again; a complete one is adopted, recording the TCX and
+    the raw GPX covering it so a later edit to either is detected.
+    """
+    recorded = manifest.inputs(output_path.stem, STAGE)
+    if recorded is None:
+        if not gpx_is_complete(output_path):
+            return True
+        try:
+            gpx_file = source_gpx(output_path, gpx_ranges)
+        except Exception:
+            return True
+        if gpx_file is not None:
+            inputs = merge_inputs(manifest, tcx_file, gpx_file, tolerance_ms)
+            manifest.record(output_path.stem, STAGE, inputs)
+        return False
+    gpx_file = tcx_file.parent / recorded["gpx_file"]
+    if not gpx_file.exists():
+        return True
+    return recorded != merge_inputs(manifest, tcx_file, gpx_file, tolerance_ms)
+
+
+def run(
+    jobs: int = 1, tolerance_ms: int = 0
+) -> tuple[list[tuple[Path, Path]], list[tuple[Path, str]]]:
+    """Merge every stale TCX file.
+
+    Returns the merged (tcx, gpx) pairs and the (path, error) failures.
+    """
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    tcx_files = list_files(RAW_DIR, ".tcx")
+    gpx_files = list_files(RAW_DIR, ".gpx")
+    manifest = Manifest.load(MANIFEST_PATH)
+    index = load_time_index(INDEX_PATH)
+    gpx_ranges = gpx_time_ranges(gpx_files, index)
+    pending = [
+        tcx_file
+        for tcx_file in tcx_files
+        if merge_is_stale(
+            manifest, tcx_file, output_path_for(tcx_file, OUT_DIR), tolerance_ms, gpx_ranges
+        )
+    ]
+    groups, failures = plan_groups(pending, gpx_files, index, OUT_DIR)
+    present = {path.name for path in (*tcx_files, *gpx_files)}
+    write_json(
+        INDEX_PATH, {name: entry for name, entry in sorted(index.items()) if name in present}
+    )
+
+    merged, run_failures = run_groups(groups, jobs, tolerance_ms)
+    for tcx_file, gpx_file in merged:
+        output_id = output_path_for(tcx_file, OUT_DIR).stem
+        manifest.record(output_id, STAGE, merge_inputs(manifest, tcx_file, gpx_file, tolerance_ms))
+    manifest.save()
+    return merged, failures + run_failures
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="number of worker processes (default: 1)"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.0,
+        help="match each GPX point to the nearest TCX sample within this many seconds "
+        "instead of requiring the same whole second",
+    )
+    args = parser.parse_args(argv)
+
+    _, failures = run(args.jobs, int(round(args.tolerance * 1000)))
+    for path, error in failures:
+        print(f"merge failed for {path.name}: {error}", file=sys.stderr)
+    if failures:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,64 @@
+"""Fan independent per-activity work out to worker processes or threads."""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from typing import Callable, Iterable, Literal
+
+# Read-only data for the tasks of the current run_tasks call, set once per worker.
+_shared: object = None
+
+
+def _set_shared(value: object) -> None:
+    global _shared
+    _shared = value
+
+
+def _call(func: Callable, args: tuple) -> object:
+    return func(*args) if _shared is None else func(_shared, *args)
+
+
+def run_tasks(
+    func: Callable,
+    tasks: Iterable[tuple],
+    jobs: int = 1,
+    kind: Literal["process", "thread"] = "process",
+    shared: object = None,
+    executor: ThreadPoolExecutor | None = None,
+) -> list:
+    """Return [func(*task) for task in tasks], computed on up to jobs workers.
+
+    Use kind="process" for CPU-bound work and kind="thread" for I/O-bound
+    work. When shared is given, func is called as func(shared, *task); worker
+    processes receive it once through the pool initializer instead of with
+    every task. Results are in task order whatever order workers finish in,
+    and the first task exception is raised. For kind="thread", executor is
+    a long-lived pool to use instead of a new one, so per-thread state such
+    as a boto3 handle survives between calls.
+    """
+    tasks = list(tasks)
+    if jobs <= 1 or len(tasks) <= 1:
+        previous = _shared
+        _set_shared(shared)
+        try:
+            return [_call(func, task) for task in tasks]
+        finally:
+            _set_shared(previous)
+    workers = min(jobs, len(tasks))
+    if kind == "thread":
+        # Threads see this module's globals, so no initializer is needed.
+        previous = _shared
+        _set_shared(shared)
+        try:
+            if executor is not None:
+                return list(executor.map(_call, repeat(func), tasks))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(_call, repeat(func), tasks))
+        finally:
+            _set_shared(previous)
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_set_shared, initargs=(shared,)
+    ) as pool:
+        return list(pool.map(_call, repeat(func), tasks, chunksize=chunksize))
@@ -0,0 +1,368 @@
+"""Run the analyze stages in one process, loading each activity payload once."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from scripts import (
+    activity,
+    context,
+    merge,
+    parallel,
+    poi,
+    uniqueness,
+    weather_archive,
+    weather_traffic,
+)
+from scripts.manifest import Manifest
+from scripts.profiling import Profiler, add_profile_arguments
+from scripts.store import ActivityStore, JsonStore, open_store
+from scripts.utils import load_json
+
+
+PROFILE_PATH = Path("data/profile-analyze.json")
+# Payloads held in memory at once; uniqueness keeps only route summaries across batches.
+BATCH_SIZE = 500
+# Top-level payload sections written by each stage.
+STAGE_SECTIONS = {
+    module.STAGE: module.SECTIONS
+    for module in (activity, weather_traffic, uniqueness, context, poi)
+}
+
+
+def start_date(payload: dict) -> str:
+    """The local start date (YYYY-MM-DD) of a payload, or "" when unknown."""
+    return ((payload.get("activity") or {}).get("start_date_local") or "")[:10]
+
+
+class Pipeline:
+    """Warm resources shared by the stages across activities and runs.
+
+    Goals and POIs are reloaded only when their file digests change, and the
+    DynamoDB table handle is created on first use unless one is passed in.
+    The uniqueness run items (route vector, centroid and distance) of stored
+    payloads are kept across runs. A long-lived Pipeline assumes it is the
+    only writer of the store. Everything cached is bounded by the OSM extract
+    and about a kilobyte per activity.
+
+    Weather/traffic samples come from the local archive. The dates a batch
+    needs that are not archived yet are fetched from DynamoDB concurrently,
+    unless offline is set. The fetch threads live as long as the Pipeline,
+    so each keeps its own table handle between runs; close() stops them. With
+    jobs > 1, GPX parsing and POI matching run on that many worker
+    processes. Results are applied in activity id order, so the payloads and
+    manifest match a serial run.
+    """
+
+    def __init__(self, table=None, jobs: int = 1, offline: bool = False) -> None:
+        self.jobs = jobs
+        self.offline = offline
+        self._archive: weather_archive.WeatherArchive | None = None
+        self._fetch_pool: ThreadPoolExecutor | None = None
+        self._goals: tuple[str, dict] | None = None
+        self._pois: tuple[str, list[dict]] | None = None
+        self._table = table
+        self._run_items: dict[str, tuple[str, dict | None]] = {}
+
+    def goals(self, digest: str) -> dict:
+        if self._goals is None or self._goals[0] != digest:
+            self._goals = (digest, load_json(context.GOALS_PATH))
+        return self._goals[1]
+
+    def pois(self, digest: str) -> list[dict]:
+        if self._pois is None or self._pois[0] != digest:
+            self._pois = (digest, poi.load_pois(poi.OSM_PATH))
+        return self._pois[1]
+
+    def table(self):
+        """The table passed in, or one boto3 table per thread."""
+        if self._table is not None:
+            return self._table
+        return weather_traffic.thread_table()
+
+    def archive(self) -> weather_archive.WeatherArchive:
+        if self._archive is None:
+            self._archive = weather_archive.WeatherArchive(weather_archive.ARCHIVE_PATH)
+        return self._archive
+
+    def fetch_dates(self, dates: list[str]) -> dict[str, list[dict]]:
+        if self._fetch_pool is None:
+            self._fetch_pool = ThreadPoolExecutor(max_workers=weather_traffic.FETCH_THREADS)
+        return weather_traffic.fetch_dates(
+            dates, get_table=self.table, executor=self._fetch_pool
+        )
+
+    def close(self) -> None:
+        """Stop the fetch threads and close the weather archive."""
+        if self._fetch_pool is not None:
+            self._fetch_pool.shutdown()
+            self._fetch_pool = None
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def compute(
+        self,
+        profiler: Profiler,
+        stage: str,
+        func,
+        tasks: dict[str, tuple],
+        shared: object = None,
+    ) -> dict[str, object]:
+        """Run func per activity id on worker processes; results keep tasks' order.
+
+        Serial runs (jobs=1) profile each activity; parallel runs only count them.
+        """
+        if self.jobs <= 1:
+            results = {}
+            for activity_id, args in tasks.items():
+                with profiler.activity(stage, activity_id):
+                    results[activity_id] = parallel.run_tasks(func, [args], shared=shared)[0]
+            return results
+        results = parallel.run_tasks(func, tasks.values(), self.jobs, "process", shared)
+        profiler.stages[stage]["items"] += len(tasks)
+        return dict(zip(tasks, results))
+
+    def run(
+        self,
+        only: set[str] | None = None,
+        since: str | None = None,
+        profiler: Profiler | None = None,
+        store: ActivityStore | None = None,
+    ) -> list[str]:
+        """Run the per-activity stages and return the ids whose payloads changed.
+
+        only restricts the run to the given activity ids; since to activities
+        starting on or after that local date. Payloads are read from and
+        written to store (default: the data/activities JSON directory) in
+        batches of BATCH_SIZE, and only the sections a stage modified are
+        written. Uniqueness runs last, over the route summaries of the whole
+        history, and writes only the uniqueness section; activities it scores
+        are therefore saved a second time.
+        """
+        profiler = profiler or Profiler()
+        store = store or JsonStore(activity.OUTPUT_DIR)
+        activity.TRACKS_DIR.mkdir(parents=True, exist_ok=True)
+        manifest = Manifest.load(activity.MANIFEST_PATH)
+
+        stored_ids = set(store.ids())
+        gpx_paths = {path.stem: path for path in sorted(activity.GPX_DIR.glob("*.gpx"))}
+        selected = [
+            activity_id
+            for activity_id in sorted(stored_ids | gpx_paths.keys())
+            if only is None or activity_id in only
+        ]
+        changed: set[str] = set()
+        unscored: dict[str, dict[str, str]] = {}
+        for start in range(0, len(selected), BATCH_SIZE):
+            changed.update(
+                self.run_batch(
+                    selected[start : start + BATCH_SIZE],
+                    gpx_paths,
+                    since,
+                    profiler,
+                    store,
+                    manifest,
+                    unscored,
+                )
+            )
+
+        with profiler.stage(uniqueness.STAGE) as entry:
+            # Uniqueness compares against every activity, selected or not.
+            history_ids = sorted(stored_ids.union(selected))
+            for activity_id in self._run_items.keys() - set(history_ids):
+                del self._run_items[activity_id]
+            if unscored:
+                summaries = uniqueness.RouteSummaries.from_run_items(
+                    (activity_id, self.run_item(store, activity_id)) for activity_id in history_ids
+                )
+                sections = uniqueness.score_sections(uniqueness.raw_scores(summaries), unscored)
+                for activity_id, section in sections.items():
+                    store.save(activity_id, {"uniqueness": section}, uniqueness.SECTIONS)
+                    manifest.record(activity_id, uniqueness.STAGE, unscored[activity_id])
+                    changed.add(activity_id)
+                entry["items"] = len(summaries.ids)
+
+        manifest.save()
+        return sorted(changed)
+
+    def run_item(self, store: ActivityStore, activity_id: str) -> dict | None:
+        """The cached uniqueness run item, loading the activity section if not cached."""
+        if activity_id not in self._run_items:
+            payload = store.load(activity_id, ["activity"]) or {}
+            uniqueness.cached_run_item(payload, activity_id, self._run_items)
+        return self._run_items[activity_id][1]
+
+    def run_batch(
+        self,
+        batch: list[str],
+        gpx_paths: dict[str, Path],
+        since: str | None,
+        profiler: Profiler,
+        store: ActivityStore,
+        manifest: Manifest,
+        unscored: dict[str, dict[str, str]],
+    ) -> list[str]:
+        """Run every stage but uniqueness on a batch of ids, save it and return the changed ids.
+
+        Activities that still need a uniqueness score are added to unscored
+        with their stage inputs; their run items are cached for the final pass.
+        """
+        payloads: dict[str, dict] = {}
+        dirty: dict[str, set[str]] = {}
+
+        def mark(activity_id: str, stage: str) -> None:
+            dirty.setdefault(activity_id, set()).update(STAGE_SECTIONS[stage])
+
+        with profiler.stage(activity.STAGE):
+            loaded: dict[str, dict] = {}
+            plans: dict[str, tuple[dict[str, str], bool]] = {}
+            for activity_id in batch:
+                payload = loaded[activity_id] = store.load(activity_id) or {}
+                gpx_path = gpx_paths.get(activity_id)
+                if gpx_path is None:
+                    continue
+                plan = activity.plan_activity(gpx_path, payload, manifest)
+                if plan is not None:
+                    plans[activity_id] = plan
+            built = self.compute(
+                profiler,
+                activity.STAGE,
+                activity.build_activity,
+                {
+                    activity_id: (
+                        gpx_paths[activity_id],
+                        activity.track_path_for(gpx_paths[activity_id]),
+                    )
+                    for activity_id in plans
+                },
+            )
+            for activity_id, payload in loaded.items():
+                if activity_id in plans and plans[activity_id][1]:
+                    # Keep enrichments from later stages; they check their own inputs.
+                    payload.update(built[activity_id])
+                    manifest.record(activity_id, activity.STAGE, plans[activity_id][0])
+                    mark(activity_id, activity.STAGE)
+                uniqueness.cached_run_item(payload, activity_id, self._run_items)
+                if since is not None and start_date(payload) < since:
+                    if activity_id in dirty:
+                        store.save(activity_id, payload, dirty.pop(activity_id))
+                    continue
+                payloads[activity_id] = payload
+
+        with profiler.stage(weather_traffic.STAGE):
+            # Each date is fetched once, even when several activities share it.
+            dates = weather_traffic.pending_dates(payloads.items(), manifest)
+            samples = weather_traffic.load_samples(
+                self.archive(),
+                weather_traffic.unique_dates(dates),
+                None if self.offline else self.fetch_dates,
+            )
+            for activity_id in dates:
+                with profiler.activity(weather_traffic.STAGE, activity_id):
+                    if weather_traffic.refresh_weather_traffic(
+                        activity_id, payloads[activity_id], manifest, samples
+                    ):
+                        mark(activity_id, weather_traffic.STAGE)
+
+        with profiler.stage(context.STAGE):
+            goals_digest = manifest.file_digest(context.GOALS_PATH)
+            for activity_id, payload in payloads.items():
+                with profiler.activity(context.STAGE, activity_id):
+                    if context.refresh_context(
+                        activity_id, payload, manifest, self.goals(goals_digest), goals_digest
+                    ):
+                        mark(activity_id, context.STAGE)
+
+        with profiler.stage(poi.STAGE):
+            osm_digest = manifest.file_digest(poi.OSM_PATH)
+            inputs = {
+                activity_id: stale_inputs
+                for activity_id, payload in payloads.items()
+                if (stale_inputs := poi.plan_poi(activity_id, payload, manifest, osm_digest))
+            }
+            categories = self.compute(
+                profiler,
+                poi.STAGE,
+                poi.points_of_interest,
+                {
+                    activity_id: (poi.extract_polyline(payloads[activity_id]),)
+                    for activity_id in inputs
+                },
+                # Sent to each worker process once, not pickled per activity.
+                shared=self.pois(osm_digest) if inputs else None,
+            )
+            for activity_id, found in categories.items():
+                poi.set_points_of_interest(payloads[activity_id], found)
+                manifest.record(activity_id, poi.STAGE, inputs[activity_id])
+                mark(activity_id, poi.STAGE)
+
+        for activity_id, payload in payloads.items():
+            inputs = uniqueness.plan_uniqueness(activity_id, payload, manifest)
+            if inputs is not None:
+                unscored[activity_id] = inputs
+        for activity_id in sorted(dirty):
+            store.save(activity_id, payloads[activity_id], sorted(dirty[activity_id]))
+        return sorted(dirty)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes per stage (default: 1)",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.0,
+        help="merge timestamp tolerance in seconds (see scripts.merge)",
+    )
+    parser.add_argument("--only", nargs="+", metavar="ID", help="only process these activity ids")
+    parser.add_argument(
+        "--since",
+        metavar="YYYY-MM-DD",
+        help="only process activities starting on or after this date",
+    )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        default=activity.OUTPUT_DIR,
+        help="activity store: a JSON directory or a .sqlite file (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="read weather/traffic samples from the local archive only",
+    )
+    add_profile_arguments(parser, PROFILE_PATH)
+    args = parser.parse_args(argv)
+
+    profiler = Profiler(enabled=args.profile is not None, pstats_dir=args.pstats)
+    with profiler.stage(merge.STAGE) as entry:
+        merged, failures = merge.run(args.jobs, int(round(args.tolerance * 1000)))
+        entry["items"] = len(merged)
+    for path, error in failures:
+        print(f"merge failed for {path.name}: {error}", file=sys.stderr)
+
+    only = set(args.only) if args.only else None
+    store = open_store(args.store)
+    runner = Pipeline(jobs=args.jobs, offline=args.offline)
+    try:
+        runner.run(only=only, since=args.since, profiler=profiler, store=store)
+    finally:
+        runner.close()
+        store.close()
+    if args.profile is not None:
+        profiler.write(args.profile)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,20 @@
 from __future__ import annotations
 
 import xml.etree.ElementTree as ET
+from functools import cache
 from pathlib import Path
+from typing import Callable
 
 import polyline
-import pyproj
-from shapely.geometry import LineString, Point, Polygon
-from shapely.ops import transform
 
-from scripts.utils import load_json, write_json
+from scripts.manifest import Manifest, digest_value
+from scripts.store import JsonStore
 
 DATA_DIR = Path("data/activities")
 OSM_PATH = Path("osm/hanoi.osm")
+MANIFEST_PATH = Path("data/manifest.json")
+STAGE = "poi"
+SECTIONS = ("geo",)
 
 POI_TAGS = [
     ("water", {"pond", "lake", "reservoir", "river"}),
@@ -42,6 +45,8 @@ def match_poi(tags: dict) -> str | None:
 
 def load_pois(osm_path: Path) -> list[dict]:
     """Parse OSM XML, extracting POI centroids for nodes and ways."""
+    from shapely.geometry import LineString, Polygon
+
     nodes: dict[str, tuple[float, float]] = {}
     pois: list[dict] = []
     context = ET.iterparse(osm_path, events=("end",))
@@ -80,6 +85,9 @@ def load_pois(osm_path: Path) -> list[dict]:
 
 def buffer_in_meters(geom, meters: float):
     """Buffer a geometry in meters by projecting to a local UTM zone."""
+    import pyproj
+    from shapely.ops import transform
+
     if geom.is_empty:
         return geom
     lon0 = geom.centroid.x
@@ -97,6 +105,8 @@ def buffer_in_meters(geom, meters: float):
 
 def hull_from_polyline(encoded: str):
     """Build a convex hull around an encoded polyline."""
+    from shapely.geometry import LineString
+
     points = polyline.decode(encoded)
     coords = [(lon, lat) for lat, lon in points]
     return LineString(coords).convex_hull
@@ -111,19 +121,12 @@ def extract_polyline(activity: dict) -> str | None:
     return None
 
 
-def enrich_activity(path: Path, pois: list[dict]) -> None:
-    activity = load_json(path)
-    geo = activity.get("geo")
-    if not isinstance(geo, dict):
-        geo = {}
-    activity["geo"] = geo
+def points_of_interest(pois: list[dict], polyline_value: str | None) -> list[str]:
+    """Sorted POI categories within 20 m of the route's convex hull."""
+    from shapely.geometry import Point
 
-    polyline_value = extract_polyline(activity)
     if not polyline_value:
-        geo["points_of_interest"] = []
-        write_json(path, activity)
-        return
-
+        return []
     hull = hull_from_polyline(polyline_value)
     buffered = buffer_in_meters(hull, 20)
     categories = set()
@@ -131,14 +134,70 @@ def enrich_activity(path: Path, pois: list[dict]) -> None:
         point = Point(poi["lon"], poi["lat"])
         if buffered.contains(point):
             categories.add(poi["category"].replace("_", " "))
-    geo["points_of_interest"] = sorted(categories)
-    write_json(path, activity)
+    return sorted(categories)
+
+
+def set_points_of_interest(activity: dict, categories: list[str]) -> None:
+    geo = activity.get("geo")
+    if not isinstance(geo, dict):
+        geo = {}
+    activity["geo"] = geo
+    geo["points_of_interest"] = categories
+
+
+def enrich_payload(activity: dict, pois: list[dict]) -> None:
+    set_points_of_interest(activity, points_of_interest(pois, extract_polyline(activity)))
+
+
+def has_points_of_interest(activity: dict) -> bool:
+    geo = activity.get("geo")
+    return isinstance(geo, dict) and "points_of_interest" in geo
+
+
+def plan_poi(
+    activity_id: str, activity: dict, manifest: Manifest, osm_digest: str
+) -> dict[str, str] | None:
+    """Return the stage inputs when points of interest must be rebuilt, otherwise None."""
+    inputs = {"osm": osm_digest, "polyline": digest_value(extract_polyline(activity))}
+    if not manifest.is_stale(activity_id, STAGE, inputs, has_points_of_interest(activity)):
+        return None
+    return inputs
+
+
+def refresh_poi(
+    activity_id: str,
+    activity: dict,
+    manifest: Manifest,
+    osm_digest: str,
+    get_pois: Callable[[], list[dict]],
+) -> bool:
+    """Rebuild points of interest when the OSM extract or route changed.
+
+    get_pois is only called when there is work, so the OSM file is parsed
+    lazily.
+    """
+    inputs = plan_poi(activity_id, activity, manifest, osm_digest)
+    if inputs is None:
+        return False
+    enrich_payload(activity, get_pois())
+    manifest.record(activity_id, STAGE, inputs)
+    return True
 
 
 def main() -> None:
-    pois = load_pois(OSM_PATH)
-    for path in sorted(DATA_DIR.glob("*.json")):
-        enrich_activity(path, pois)
+    manifest = Manifest.load(MANIFEST_PATH)
+    osm_digest = manifest.file_digest(OSM_PATH)
+
+    @cache
+    def get_pois() -> list[dict]:
+        return load_pois(OSM_PATH)
+
+    store = JsonStore(DATA_DIR)
+    for activity_id in store.ids():
+        activity = store.load(activity_id)
+        if refresh_poi(activity_id, activity, manifest, osm_digest, get_pois):
+            store.save(activity_id, activity, SECTIONS)
+    manifest.save()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+"""Per-stage and per-activity timing, memory and cProfile reports."""
+
+from __future__ import annotations
+
+import argparse
+import cProfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from scripts.utils import write_json
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser, default_path: Path) -> None:
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        nargs="?",
+        const=default_path,
+        metavar="PATH",
+        help=f"write a JSON timing/memory report per stage and activity (default: {default_path})",
+    )
+    parser.add_argument(
+        "--pstats",
+        type=Path,
+        metavar="DIR",
+        help="with --profile, also dump a cProfile <stage>.pstats file per stage into DIR",
+    )
+
+
+def _stage_entry() -> dict:
+    return {"wall_s": 0.0, "cpu_s": 0.0, "peak_bytes": 0, "items": 0, "activities": {}}
+
+
+class Profiler:
+    """Collect wall time, CPU time, peak tracemalloc memory and item counts.
+
+    A disabled profiler (the default) adds no overhead; its contexts only
+    yield. tracemalloc slows Python code down several times, so timing-only
+    callers can pass trace_memory=False (peak_bytes then stays 0). Work done
+    in worker processes is not seen by tracemalloc, cProfile or the CPU clock.
+    """
+
+    def __init__(
+        self, enabled: bool = False, pstats_dir: Path | None = None, trace_memory: bool = True
+    ) -> None:
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.pstats_dir = pstats_dir
+        self.stages: dict[str, dict] = {}
+        self._profiles: dict[str, cProfile.Profile] = {}
+        self._stage_peak = 0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[dict]:
+        """Measure a whole stage; callers may set the yielded entry's "items".
+
+        A stage entered several times (once per batch) accumulates.
+        """
+        entry = self.stages.setdefault(name, _stage_entry())
+        if not self.enabled:
+            yield entry
+            return
+        started = self.trace_memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._stage_peak = 0
+        profile = None
+        if self.pstats_dir is not None:
+            profile = self._profiles.setdefault(name, cProfile.Profile())
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield entry
+        finally:
+            if profile is not None:
+                profile.disable()
+                self.pstats_dir.mkdir(parents=True, exist_ok=True)
+                profile.dump_stats(self.pstats_dir / f"{name}.pstats")
+            entry["wall_s"] += time.perf_counter() - wall
+            entry["cpu_s"] += time.process_time() - cpu
+            if self.trace_memory:
+                peak = max(self._stage_peak, tracemalloc.get_traced_memory()[1])
+                entry["peak_bytes"] = max(entry["peak_bytes"], peak)
+            if started:
+                tracemalloc.stop()
+
+    @contextmanager
+    def activity(self, stage: str, activity_id: str) -> Iterator[None]:
+        """Measure one activity inside an open stage and count it as an item."""
+        if not self.enabled:
+            yield
+            return
+        entry = self.stages.setdefault(stage, _stage_entry())
+        if self.trace_memory:
+            # Fold the stage's peak so far before resetting it for this activity.
+            self._stage_peak = max(self._stage_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else 0
+            self._stage_peak = max(self._stage_peak, peak)
+            entry["items"] += 1
+            entry["activities"][activity_id] = {
+                "wall_s": time.perf_counter() - wall,
+                "cpu_s": time.process_time() - cpu,
+                "peak_bytes": peak,
+            }
+
+    def report(self) -> dict:
+        return {
+            "stages": self.stages,
+            "total": {
+                "wall_s": sum(entry["wall_s"] for entry in self.stages.values()),
+                "cpu_s": sum(entry["cpu_s"] for entry in self.stages.values()),
+            },
+        }
+
+    def write(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_json(path, self.report())
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import numpy as np
+
+# Approximate meters per degree, used to express tolerances in degrees.
+METERS_PER_DEGREE = 111_320
+
+
+def _segment_distances(
+    xs: np.ndarray, ys: np.ndarray, x0: float, y0: float, x1: float, y1: float
+) -> np.ndarray:
+    """Planar distance from each point to the segment (x0, y0)-(x1, y1)."""
+    dx = x1 - x0
+    dy = y1 - y0
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return np.hypot(xs - x0, ys - y0)
+    t = np.clip(((xs - x0) * dx + (ys - y0) * dy) / length_sq, 0.0, 1.0)
+    return np.hypot(xs - (x0 + t * dx), ys - (y0 + t * dy))
+
+
+def simplify_indices(lats: np.ndarray, lons: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Douglas-Peucker simplification returning the indices of kept points.
+
+    Matches shapely's simplify(preserve_topology=False) on (lon, lat) with the
+    tolerance converted to degrees, but works on indices so repeated
+    coordinates stay distinct. Uses an explicit stack instead of recursion.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    count = len(lats)
+    if count <= 2:
+        return np.arange(count)
+    tolerance = tolerance_m / METERS_PER_DEGREE
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        distances = _segment_distances(
+            lons[start + 1 : end],
+            lats[start + 1 : end],
+            lons[start],
+            lats[start],
+            lons[end],
+            lats[end],
+        )
+        offset = int(np.argmax(distances))
+        if distances[offset] <= tolerance:
+            continue
+        split = start + 1 + offset
+        keep[split] = True
+        stack.append((split, end))
+        stack.append((start, split))
+    return np.flatnonzero(keep)
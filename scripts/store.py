@@ -0,0 +1,309 @@
+"""Activity payload storage: a JSON directory or an indexed SQLite database.
+
+Payloads are dicts of top-level sections ("activity", "weather", "traffic",
+"uniqueness", "activity_context", "geo"), each owned by one stage. Both
+backends load and save by section, so a stage can update its own output
+without rewriting the rest. The SQLite backend also indexes start date,
+distance and the route bounding box for range queries; the JSON directory
+remains the export format.
+
+Run `python -m scripts.store export data/activities.sqlite data/activities`
+(or `import`) to copy every payload between backends.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+from pathlib import Path
+from typing import Iterable
+
+import polyline
+
+from scripts.locks import file_lock
+from scripts.utils import load_json, write_json
+
+SQLITE_SUFFIXES = {".db", ".sqlite", ".sqlite3"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (
+    id TEXT PRIMARY KEY,
+    start_date TEXT,
+    distance REAL,
+    min_lat REAL,
+    min_lon REAL,
+    max_lat REAL,
+    max_lon REAL,
+    centroid_lat REAL,
+    centroid_lon REAL
+);
+CREATE INDEX IF NOT EXISTS activities_start_date ON activities (start_date);
+CREATE INDEX IF NOT EXISTS activities_distance ON activities (distance);
+CREATE INDEX IF NOT EXISTS activities_bbox ON activities (min_lat, max_lat, min_lon, max_lon);
+CREATE TABLE IF NOT EXISTS sections (
+    activity_id TEXT NOT NULL REFERENCES activities (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (activity_id, name)
+);
+"""
+
+
+def index_fields(payload: dict) -> dict:
+    """Start date, distance, bbox and centroid of a payload's route, None when unknown."""
+    activity = payload.get("activity") or {}
+    start_date = activity.get("start_date_local")
+    fields = {
+        "start_date": start_date[:10] if start_date else None,
+        "distance": activity.get("distance"),
+        "min_lat": None,
+        "min_lon": None,
+        "max_lat": None,
+        "max_lon": None,
+        "centroid_lat": None,
+        "centroid_lon": None,
+    }
+    encoded = (activity.get("map") or {}).get("polyline")
+    points = polyline.decode(encoded) if encoded else []
+    if points:
+        lats = [lat for lat, _ in points]
+        lons = [lon for _, lon in points]
+        fields.update(
+            min_lat=min(lats),
+            min_lon=min(lons),
+            max_lat=max(lats),
+            max_lon=max(lons),
+            centroid_lat=sum(lats) / len(lats),
+            centroid_lon=sum(lons) / len(lons),
+        )
+    return fields
+
+
+class JsonStore:
+    """One `<id>.json` file per activity, as written by the stage scripts.
+
+    Saves hold a per-activity lock file in the sibling `locks` directory, so
+    processes updating different sections of one payload don't lose writes.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.locks_dir = directory.parent / "locks"
+
+    def path(self, activity_id: str) -> Path:
+        return self.directory / f"{activity_id}.json"
+
+    def ids(self) -> list[str]:
+        return sorted(path.stem for path in self.directory.glob("*.json"))
+
+    def load(self, activity_id: str, sections: Iterable[str] | None = None) -> dict | None:
+        path = self.path(activity_id)
+        if not path.exists():
+            return None
+        payload = load_json(path)
+        if sections is None:
+            return payload
+        return {name: payload[name] for name in sections if name in payload}
+
+    def save(self, activity_id: str, payload: dict, sections: Iterable[str] | None = None) -> None:
+        """Write the given sections (default: all) over the stored payload."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.locks_dir / f"{activity_id}.lock"):
+            if sections is None:
+                write_json(self.path(activity_id), payload)
+                return
+            stored = self.load(activity_id) or {}
+            for name in sections:
+                if name in payload:
+                    stored[name] = payload[name]
+                else:
+                    stored.pop(name, None)
+            write_json(self.path(activity_id), stored)
+
+    def query(
+        self,
+        since: str | None = None,
+        until: str | None = None,
+        bbox: tuple[float, float, float, float] | None = None,
+    ) -> list[str]:
+        """Ids by local start date range and (min_lat, min_lon, max_lat, max_lon) overlap.
+
+        Reads every file; the SQLite backend answers from its indexes.
+        """
+        matches = []
+        for activity_id in self.ids():
+            fields = index_fields(self.load(activity_id, ["activity"]) or {})
+            if _matches(fields, since, until, bbox):
+                matches.append(activity_id)
+        return matches
+
+    def close(self) -> None:
+        pass
+
+
+def _matches(
+    fields: dict,
+    since: str | None,
+    until: str | None,
+    bbox: tuple[float, float, float, float] | None,
+) -> bool:
+    start_date = fields["start_date"]
+    if since is not None and (start_date is None or start_date < since):
+        return False
+    if until is not None and (start_date is None or start_date > until):
+        return False
+    if bbox is not None:
+        if fields["min_lat"] is None:
+            return False
+        min_lat, min_lon, max_lat, max_lon = bbox
+        if (
+            fields["max_lat"] < min_lat
+            or fields["min_lat"] > max_lat
+            or fields["max_lon"] < min_lon
+            or fields["min_lon"] > max_lon
+        ):
+            return False
+    return True
+
+
+class SqliteStore:
+    """Payload sections as JSON rows, with indexed per-activity route fields."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        # SQLite locks the database itself; wait for other writers rather than failing.
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+
+    def ids(self) -> list[str]:
+        rows = self.connection.execute("SELECT id FROM activities ORDER BY id")
+        return [row[0] for row in rows]
+
+    def load(self, activity_id: str, sections: Iterable[str] | None = None) -> dict | None:
+        exists = self.connection.execute(
+            "SELECT 1 FROM activities WHERE id = ?", (activity_id,)
+        ).fetchone()
+        if exists is None:
+            return None
+        query = "SELECT name, value FROM sections WHERE activity_id = ?"
+        params: list = [activity_id]
+        if sections is not None:
+            names = list(sections)
+            query += f" AND name IN ({', '.join('?' * len(names))})"
+            params.extend(names)
+        # rowid order keeps the payload's key order stable across updates.
+        rows = self.connection.execute(query + " ORDER BY rowid", params)
+        return {name: json.loads(value) for name, value in rows}
+
+    def save(self, activity_id: str, payload: dict, sections: Iterable[str] | None = None) -> None:
+        """Upsert the given sections (default: all), leaving the others untouched."""
+        names = list(payload) if sections is None else list(sections)
+        with self.connection:
+            fields = index_fields(payload) if "activity" in names or sections is None else None
+            self.connection.execute(
+                "INSERT INTO activities (id) VALUES (?) ON CONFLICT (id) DO NOTHING",
+                (activity_id,),
+            )
+            if fields is not None:
+                self.connection.execute(
+                    "UPDATE activities SET "
+                    + ", ".join(f"{column} = :{column}" for column in fields)
+                    + " WHERE id = :id",
+                    {**fields, "id": activity_id},
+                )
+            if sections is None:
+                # A full save replaces the payload, so drop sections it no longer has.
+                stored = self.connection.execute(
+                    "SELECT name FROM sections WHERE activity_id = ?", (activity_id,)
+                )
+                names.extend(name for (name,) in stored.fetchall() if name not in payload)
+            for name in names:
+                if name not in payload:
+                    self.connection.execute(
+                        "DELETE FROM sections WHERE activity_id = ? AND name = ?",
+                        (activity_id, name),
+                    )
+                    continue
+                self.connection.execute(
+                    "INSERT INTO sections (activity_id, name, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (activity_id, name) DO UPDATE SET value = excluded.value",
+                    (activity_id, name, json.dumps(payload[name], ensure_ascii=True)),
+                )
+
+    def query(
+        self,
+        since: str | None = None,
+        until: str | None = None,
+        bbox: tuple[float, float, float, float] | None = None,
+    ) -> list[str]:
+        """Ids by local start date range and (min_lat, min_lon, max_lat, max_lon) overlap."""
+        clauses = []
+        params: list = []
+        if since is not None:
+            clauses.append("start_date >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("start_date <= ?")
+            params.append(until)
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            clauses.append("max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?")
+            params.extend([min_lat, max_lat, min_lon, max_lon])
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.connection.execute(f"SELECT id FROM activities{where} ORDER BY id", params)
+        return [row[0] for row in rows]
+
+    def centroids(self) -> dict[str, tuple[float, float]]:
+        rows = self.connection.execute(
+            "SELECT id, centroid_lat, centroid_lon FROM activities "
+            "WHERE centroid_lat IS NOT NULL ORDER BY id"
+        )
+        return {activity_id: (lat, lon) for activity_id, lat, lon in rows}
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+ActivityStore = JsonStore | SqliteStore
+
+
+def open_store(path: Path) -> ActivityStore:
+    """A SQLite store for .db/.sqlite paths, otherwise a JSON directory."""
+    if path.suffix in SQLITE_SUFFIXES:
+        return SqliteStore(path)
+    return JsonStore(path)
+
+
+def copy_store(source: ActivityStore, target: ActivityStore) -> int:
+    """Copy every payload from source to target and return how many were copied."""
+    activity_ids = source.ids()
+    for activity_id in activity_ids:
+        target.save(activity_id, source.load(activity_id))
+    return len(activity_ids)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Copy activity payloads between stores.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("database", type=Path, help="SQLite store, e.g. data/activities.sqlite")
+    parser.add_argument("directory", type=Path, help="JSON directory, e.g. data/activities")
+    args = parser.parse_args(argv)
+
+    database = SqliteStore(args.database)
+    directory = JsonStore(args.directory)
+    try:
+        if args.command == "export":
+            count = copy_store(database, directory)
+        else:
+            count = copy_store(directory, database)
+    finally:
+        database.close()
+    print(f"{args.command}ed {count} activities")
+
+
+if __name__ == "__main__":
+    main()
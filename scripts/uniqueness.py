@@ -1,13 +1,16 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 from pathlib import Path
-from statistics import median
+from typing import Iterable
 
 import numpy as np
 import polyline
-from shapely.geometry import LineString
 
-from scripts.utils import load_json, write_json
+from scripts.manifest import Manifest, digest_value
+from scripts.simplify import simplify_indices
+from scripts.store import JsonStore
+from scripts.utils import load_json
 
 UNIQUENESS_MIN = 1
 UNIQUENESS_MAX = 100
@@ -32,6 +35,9 @@ UNIQUENESS_WORDS = [
 
 DATA_DIR = Path("data")
 ACTIVITIES_DIR = DATA_DIR / "activities"
+MANIFEST_PATH = DATA_DIR / "manifest.json"
+STAGE = "uniqueness"
+SECTIONS = ("uniqueness",)
 COARSE_SIMPLIFY_M = 35
 ROUTE_MAX_POINTS = 48
 DISTANCE_WEIGHT = 0.35
@@ -51,10 +57,9 @@ def simplify_points(
 ) -> list[tuple[float, float]]:
     if len(points) <= 2:
         return points
-    tolerance = tolerance_m / 111_320
-    line = LineString([(lon, lat) for lat, lon in points])
-    simplified = line.simplify(tolerance, preserve_topology=False)
-    return [(lat, lon) for lon, lat in simplified.coords]
+    coords = np.array(points, dtype=float)
+    indices = simplify_indices(coords[:, 0], coords[:, 1], tolerance_m)
+    return [points[index] for index in indices.tolist()]
 
 
 def build_route_vector(points: list[tuple[float, float]]) -> np.ndarray:
@@ -103,17 +108,6 @@ def pad_or_trim_vector(
     return vector
 
 
-def zscore_values(values: list[float]) -> list[float]:
-    if not values:
-        return []
-    array = np.array(values, dtype=float)
-    mean = float(array.mean())
-    std = float(array.std())
-    if std == 0:
-        return [0.0 for _ in values]
-    return [float((value - mean) / std) for value in values]
-
-
 def build_run_item(payload: dict, activity_id: str | None = None) -> dict | None:
     activity = payload.get("activity") or payload
     activity_id = activity.get("id") or activity_id
@@ -135,86 +129,83 @@ def build_run_item(payload: dict, activity_id: str | None = None) -> dict | None
     }
 
 
-def build_reference_runs(payloads: list[dict] | None = None) -> list[dict]:
-    runs: list[dict] = []
-    if payloads is None:
-        for path in ACTIVITIES_DIR.glob("*.json"):
-            payload = load_json(path)
-            run_item = build_run_item(payload, activity_id=path.stem)
+@dataclass
+class RouteSummaries:
+    """Run items packed into arrays: one row per activity with a route."""
+
+    ids: list[str]
+    vectors: np.ndarray  # (N, 2 * ROUTE_MAX_POINTS)
+    centroids: np.ndarray  # (N, 2) lat, lon
+    distances: np.ndarray  # (N,) metres, NaN when unknown
+
+    @classmethod
+    def from_run_items(cls, items: Iterable[tuple[str, dict | None]]) -> RouteSummaries:
+        """Pack (activity_id, run_item) pairs, skipping activities without a route."""
+        ids: list[str] = []
+        rows: list[np.ndarray] = []
+        centroids: list[tuple[float, float]] = []
+        distances: list[float] = []
+        for activity_id, run_item in items:
             if not run_item:
                 continue
-            runs.append(run_item)
-        return runs
+            ids.append(activity_id)
+            rows.append(run_item["vector"])
+            centroids.append(run_item["centroid"])
+            distance_m = run_item.get("distance_m")
+            distances.append(np.nan if distance_m is None else distance_m)
+        return cls(
+            ids=ids,
+            vectors=np.array(rows, dtype=float).reshape(len(ids), 2 * ROUTE_MAX_POINTS),
+            centroids=np.array(centroids, dtype=float).reshape(len(ids), 2),
+            distances=np.array(distances, dtype=float),
+        )
+
 
-    for payload in payloads:
-        run_item = build_run_item(payload)
-        if not run_item:
+def raw_scores(summaries: RouteSummaries) -> dict[str, float]:
+    """Score every route against all the others.
+
+    A route's distance to another sums the route vector norm, the weighted
+    distance z-score gap (when every distance is known) and the weighted
+    centroid z-score offset. The score maps min / median of those distances
+    from UNIQUENESS_MAX (far from everything) toward UNIQUENESS_MIN.
+    Activities without a score are left out. Rows are scored one at a time
+    because a full (N, N) distance matrix would not fit in memory.
+    """
+    count = len(summaries.ids)
+    if count < 2:
+        return {}
+    lat_z = zscore_array(summaries.centroids[:, 0])
+    lon_z = zscore_array(summaries.centroids[:, 1])
+    distance_z = None
+    if not np.isnan(summaries.distances).any():
+        distance_z = zscore_array(summaries.distances)
+    scores = {}
+    for index, activity_id in enumerate(summaries.ids):
+        combined = np.linalg.norm(summaries.vectors - summaries.vectors[index], axis=1)
+        if distance_z is not None:
+            combined += DISTANCE_WEIGHT * np.abs(distance_z[index] - distance_z)
+        combined += CENTROID_WEIGHT * np.sqrt(
+            (lat_z[index] - lat_z) ** 2 + (lon_z[index] - lon_z) ** 2
+        )
+        combined = np.delete(combined, index)
+        median_distance = float(np.median(combined))
+        if median_distance == 0:
+            scores[activity_id] = UNIQUENESS_MAX
             continue
-        runs.append(run_item)
-    return runs
+        ratio = float(combined.min()) / median_distance
+        scores[activity_id] = UNIQUENESS_MAX - ratio * (UNIQUENESS_MAX - UNIQUENESS_MIN)
+    return scores
 
 
-def calculate_uniqueness_score(distances: list[float]) -> float | None:
-    """Calculate a raw uniqueness score from cosine distances."""
-    if not distances:
-        return None
-    median_distance = median(distances)
-    if median_distance == 0:
-        return UNIQUENESS_MAX
-    ratio = min(distances) / median_distance
-    return UNIQUENESS_MAX - ratio * (UNIQUENESS_MAX - UNIQUENESS_MIN)
-
-
-def uniqueness_for_activity(
-    payload: dict, reference_runs: list[dict], activity_id: str | None = None
-) -> float | None:
-    run_item = build_run_item(payload, activity_id=activity_id)
-    if not run_item or not reference_runs:
-        return None
-    filtered_runs = [run for run in reference_runs if run["id"] != run_item["id"]]
-    if not filtered_runs:
-        return None
-    distances = []
-    route_distances = [
-        float(np.linalg.norm(run_item["vector"] - reference["vector"]))
-        for reference in filtered_runs
-    ]
-
-    distance_values = [run_item.get("distance_m")] + [
-        reference.get("distance_m") for reference in filtered_runs
-    ]
-    centroid_lats = [run_item["centroid"][0]] + [
-        reference["centroid"][0] for reference in filtered_runs
-    ]
-    centroid_lons = [run_item["centroid"][1]] + [
-        reference["centroid"][1] for reference in filtered_runs
-    ]
-    centroid_lat_z = zscore_values(centroid_lats)
-    centroid_lon_z = zscore_values(centroid_lons)
-    centroid_distances = [
-        float(
-            ((centroid_lat_z[0] - centroid_lat_z[i]) ** 2 + (centroid_lon_z[0] - centroid_lon_z[i]) ** 2)
-            ** 0.5
+def stage_inputs(payload: dict) -> dict[str, str]:
+    """Uniqueness is fixed when first scored; only the route itself invalidates it."""
+    activity = payload.get("activity") or payload
+    map_data = activity.get("map") or {}
+    return {
+        "route": digest_value(
+            {"polyline": map_data.get("polyline"), "distance": activity.get("distance")}
         )
-        for i in range(1, len(centroid_lat_z))
-    ]
-    if all(value is not None for value in distance_values):
-        zscores = zscore_values([float(value) for value in distance_values])
-        activity_distance = zscores[0]
-        reference_distances = zscores[1:]
-        for route_distance, distance_score, centroid_distance in zip(
-            route_distances, reference_distances, centroid_distances
-        ):
-            distances.append(
-                route_distance
-                + DISTANCE_WEIGHT * abs(activity_distance - distance_score)
-                + CENTROID_WEIGHT * centroid_distance
-            )
-    else:
-        for route_distance, centroid_distance in zip(route_distances, centroid_distances):
-            distances.append(route_distance + CENTROID_WEIGHT * centroid_distance)
-
-    return calculate_uniqueness_score(distances)
+    }
 
 
 def uniqueness_description(score: float | None) -> str | None:
@@ -226,38 +217,71 @@ def uniqueness_description(score: float | None) -> str | None:
     return UNIQUENESS_WORDS[index]
 
 
-def main() -> None:
-    reference_runs = build_reference_runs()
-
-    raw_scores: dict[Path, float | None] = {}
-    for path in ACTIVITIES_DIR.glob("*.json"):
-        payload = load_json(path)
-        raw_scores[path] = uniqueness_for_activity(
-            payload, reference_runs, activity_id=path.stem
-        )
+def cached_run_item(
+    payload: dict, activity_id: str, cache: dict[str, tuple[str, dict | None]] | None
+) -> dict | None:
+    """build_run_item, memoized per activity on the route digest when cache is given."""
+    if cache is None:
+        return build_run_item(payload, activity_id=activity_id)
+    route = stage_inputs(payload)["route"]
+    cached = cache.get(activity_id)
+    if cached is None or cached[0] != route:
+        cached = (route, build_run_item(payload, activity_id=activity_id))
+        cache[activity_id] = cached
+    return cached[1]
+
+
+def plan_uniqueness(
+    activity_id: str, payload: dict, manifest: Manifest
+) -> dict[str, str] | None:
+    """Return the stage inputs when the activity must be scored, otherwise None."""
+    inputs = stage_inputs(payload)
+    if not manifest.is_stale(activity_id, STAGE, inputs, "uniqueness" in payload):
+        return None
+    return inputs
 
-    valid_scores = [score for score in raw_scores.values() if score is not None]
-    if not valid_scores:
-        return
 
-    min_score = min(valid_scores)
-    max_score = max(valid_scores)
+def score_sections(raw: dict[str, float], activity_ids: Iterable[str]) -> dict[str, dict]:
+    """Uniqueness sections for activity_ids, normalized over every raw score.
 
-    for path, raw_score in raw_scores.items():
-        payload = load_json(path)
-        if "uniqueness" in payload:
-            continue
+    Returns nothing when no activity could be scored, so callers retry later.
+    """
+    if not raw:
+        return {}
+    min_score = min(raw.values())
+    max_score = max(raw.values())
+    sections = {}
+    for activity_id in activity_ids:
+        raw_score = raw.get(activity_id)
         if raw_score is None:
-            payload["uniqueness"] = {"description": None}
-            write_json(path, payload)
+            sections[activity_id] = {"description": None}
             continue
         if min_score == max_score:
             score = UNIQUENESS_MAX
         else:
             normalized = (raw_score - min_score) / (max_score - min_score)
             score = UNIQUENESS_MIN + (UNIQUENESS_MAX - UNIQUENESS_MIN) * normalized
-        payload["uniqueness"] = {"description": uniqueness_description(score)}
-        write_json(path, payload)
+        sections[activity_id] = {"description": uniqueness_description(score)}
+    return sections
+
+
+def main() -> None:
+    """Score stale activities while holding one payload and the route summaries in memory."""
+    manifest = Manifest.load(MANIFEST_PATH)
+    paths = sorted(ACTIVITIES_DIR.glob("*.json"))
+    stale = {
+        path.stem: inputs
+        for path in paths
+        if (inputs := plan_uniqueness(path.stem, load_json(path), manifest)) is not None
+    }
+    if stale:
+        summaries = RouteSummaries.from_run_items(
+            (path.stem, build_run_item(load_json(path), activity_id=path.stem)) for path in paths
+        )
+        for activity_id, section in score_sections(raw_scores(summaries), stale).items():
+            JsonStore(ACTIVITIES_DIR).save(activity_id, {"uniqueness": section}, SECTIONS)
+            manifest.record(activity_id, STAGE, stale[activity_id])
+    manifest.save()
 
 
 if __name__ == "__main__":
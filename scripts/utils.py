@@ -1,10 +1,18 @@
 from __future__ import annotations
 
 import json
+import math
+import os
+import secrets
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
+from typing import Iterator
 
-from dotenv import load_dotenv
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 def parse_iso(value: str) -> datetime:
@@ -20,12 +28,91 @@ def load_json(path: Path) -> dict | list:
         return json.load(handle)
 
 
-def write_json(path: Path, payload: dict) -> None:
-    """Write JSON payloads with stable indentation for diffs."""
-    with path.open("w", encoding="utf-8") as handle:
-        json.dump(payload, handle, ensure_ascii=True, indent=2)
+def dumps_json(payload: object) -> bytes:
+    """Serialize with stable indentation for diffs, as json.dumps(indent=2) would.
+
+    Uses orjson when installed. Non-ASCII text, integers beyond 64 bits,
+    non-string keys and NaN or infinity (which orjson writes as null) fall
+    back to the stdlib. The orjson output parses to the same values, but it
+    is not byte-identical for floats below 1e-4 (0.00001, not 1e-05), so a
+    file written by the other serializer is rewritten once.
+    """
+    if orjson is not None:
+        try:
+            data = orjson.dumps(payload, option=orjson.OPT_INDENT_2)
+        except TypeError:
+            pass
+        else:
+            if data.isascii() and not (b"null" in data and _has_non_finite(payload)):
+                return data
+    return json.dumps(payload, ensure_ascii=True, indent=2).encode("ascii")
+
+
+def _has_non_finite(value: object) -> bool:
+    """Whether value holds a NaN or infinite float anywhere."""
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any(_has_non_finite(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_has_non_finite(item) for item in value)
+    return False
+
+
+def _create_sibling(path: Path) -> Path:
+    """Create an empty hidden sibling of path with the umask-based mode of a new file."""
+    while True:
+        tmp_path = path.with_name(f".{path.name}.{secrets.token_hex(4)}.tmp")
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return tmp_path
+
+
+@contextmanager
+def atomic_output(path: Path) -> Iterator[Path]:
+    """Yield a temporary sibling to write, renamed over path when the block succeeds.
+
+    Readers never see a partial file; if the block raises, path is untouched.
+    A replaced file keeps its permissions; a new one gets the umask-based mode.
+    """
+    tmp_path = _create_sibling(path)
+    try:
+        yield tmp_path
+        try:
+            os.chmod(tmp_path, path.stat().st_mode & 0o777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink()
+        raise
+
+
+def write_json(path: Path, payload: object) -> bool:
+    """Write JSON payloads atomically, skipping the write when nothing changed.
+
+    The payload is serialized in memory and compared with the file on disk;
+    a changed file is written to a temporary sibling and renamed over the
+    target, so readers never see a partial file. Returns True if written.
+    """
+    data = dumps_json(payload)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        pass
+    else:
+        if stat.st_size == len(data) and path.read_bytes() == data:
+            return False
+    with atomic_output(path) as tmp_path:
+        tmp_path.write_bytes(data)
+    return True
 
 
 def load_env(path: Path) -> None:
     """Load dotenv-style API keys for scripts."""
+    from dotenv import load_dotenv
+
     load_dotenv(path, override=True)
@@ -0,0 +1,148 @@
+"""Poll data/raw and run new activities through the pipeline with warm caches.
+
+The first cycle catches up on everything, like `make analyze`. After that a
+change to data/raw is handled once the directory listing has stayed the same
+for one poll interval, so half-copied files are not merged. Only the
+activities the merge produced are re-run; if the pipeline fails, they stay
+pending and are retried every cycle until a run succeeds. Goals, POIs, the
+fetch threads with their DynamoDB table handles, history and uniqueness
+route vectors stay in memory between cycles.
+SIGINT/SIGTERM finish the current cycle and exit; a second signal aborts it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import signal
+import sys
+import threading
+from pathlib import Path
+
+from scripts import activity, merge
+from scripts.pipeline import Pipeline
+from scripts.store import ActivityStore, open_store
+
+POLL_SECONDS = 10.0
+
+
+def snapshot(raw_dir: Path) -> dict[str, tuple[int, int]]:
+    """(mtime_ns, size) per raw GPX/TCX file name."""
+    if not raw_dir.exists():
+        return {}
+    return {
+        path.name: (stat.st_mtime_ns, stat.st_size)
+        for path in raw_dir.iterdir()
+        if path.suffix.lower() in {".gpx", ".tcx"} and (stat := path.stat())
+    }
+
+
+class Watcher:
+    """One merge + pipeline cycle per settled change to the raw directory."""
+
+    def __init__(
+        self,
+        store: ActivityStore,
+        jobs: int = 1,
+        tolerance_ms: int = 0,
+        pipeline: Pipeline | None = None,
+    ) -> None:
+        self.store = store
+        self.jobs = jobs
+        self.tolerance_ms = tolerance_ms
+        self.pipeline = pipeline or Pipeline(jobs=jobs)
+        self.processed: dict[str, tuple[int, int]] | None = None
+        self.seen: dict[str, tuple[int, int]] | None = None
+        # Merged ids still to run through the pipeline; None means every activity.
+        self.pending: set[str] | None = None
+
+    def cycle(self) -> list[str]:
+        """Process the raw directory if it changed and has settled; return changed ids."""
+        current = snapshot(merge.RAW_DIR)
+        if current != self.processed:
+            if self.processed is not None and current != self.seen:
+                # Still changing (or just changed): wait one interval for it to settle.
+                self.seen = current
+                return []
+            merged, failures = merge.run(self.jobs, self.tolerance_ms)
+            for path, error in failures:
+                print(f"merge failed for {path.name}: {error}", file=sys.stderr)
+            self.processed = self.seen = current
+            if self.pending is not None:
+                self.pending.update(
+                    merge.output_path_for(tcx_file, merge.OUT_DIR).stem for tcx_file, _ in merged
+                )
+        if self.pending is not None and not self.pending:
+            return []
+        # The merge manifest already has these ids, so keep them until the run succeeds.
+        changed = self.pipeline.run(only=self.pending, store=self.store)
+        self.pending = set()
+        return changed
+
+
+def install_stop_handlers(stop: threading.Event) -> None:
+    """Set stop on the first SIGINT/SIGTERM and restore default handling for the next."""
+
+    def handle(signum, frame) -> None:
+        stop.set()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    signal.signal(signal.SIGINT, handle)
+    signal.signal(signal.SIGTERM, handle)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=POLL_SECONDS,
+        help="seconds between polls (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="number of worker processes per stage (default: 1)"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.0,
+        help="merge timestamp tolerance in seconds (see scripts.merge)",
+    )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        default=activity.OUTPUT_DIR,
+        help="activity store: a JSON directory or a .sqlite file (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="read weather/traffic samples from the local archive only",
+    )
+    args = parser.parse_args(argv)
+
+    stop = threading.Event()
+    install_stop_handlers(stop)
+    store = open_store(args.store)
+    pipeline = Pipeline(jobs=args.jobs, offline=args.offline)
+    watcher = Watcher(store, args.jobs, int(round(args.tolerance * 1000)), pipeline)
+    try:
+        while not stop.is_set():
+            try:
+                changed = watcher.cycle()
+            except Exception as exc:
+                # Keep the daemon alive; pending activities are retried next cycle.
+                print(f"watch cycle failed: {type(exc).__name__}: {exc}", file=sys.stderr)
+                changed = []
+            if changed:
+                print(f"updated {len(changed)} activities: {', '.join(changed)}", flush=True)
+            stop.wait(args.interval)
+    finally:
+        pipeline.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Local SQLite mirror of the DynamoDB weather/traffic samples.
+
+The DynamoDB table keeps samples for `ttl_days` only (see
+terraform/variables.tf). The archive keeps them for good, indexed on
+(date, hour, context). Each sync upserts what the table returns, so rows
+are never lost when a later query comes back short. A date is re-queried
+on every sync until it is `ttl_days` old, when its first samples start to
+expire, and is then marked complete (dates are in Hanoi time, like the
+lambda's). A sync therefore only queries the last few days. Run
+`python -m scripts.weather_archive sync` at least every `ttl_days` (or let
+`scripts.weather_traffic` and `scripts.pipeline` sync the dates they need).
+Pass `--offline` to those scripts to read only from the archive.
+
+Items written before the date index existed lack `context_hour` and are
+missing from index queries; `python -m scripts.weather_archive backfill`
+sets it on them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Iterable
+from zoneinfo import ZoneInfo
+
+ARCHIVE_PATH = Path("data/weather.sqlite")
+LOCAL_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+# var.ttl_days in terraform/variables.tf.
+TTL_DAYS = 2
+# Today plus every past date that is not complete yet.
+SYNC_DAYS = TTL_DAYS + 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    context TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (date, hour, context)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS synced_dates (
+    date TEXT PRIMARY KEY,
+    complete INTEGER NOT NULL
+);
+"""
+
+
+def local_today() -> date:
+    return datetime.now(LOCAL_TZ).date()
+
+
+class WeatherArchive:
+    """Samples shaped like DynamoDB items, with numbers decoded from Decimal."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+
+    def complete_dates(self) -> set[str]:
+        rows = self.connection.execute("SELECT date FROM synced_dates WHERE complete")
+        return {row[0] for row in rows}
+
+    def items(self, day: str) -> list[dict]:
+        rows = self.connection.execute(
+            "SELECT hour, context, data FROM samples WHERE date = ? ORDER BY context, hour",
+            (day,),
+        )
+        return [
+            {"date": day, "hour": hour, "context": context, "data": json.loads(data)}
+            for hour, context, data in rows
+        ]
+
+    def add(self, day: str, items: list[dict], complete: bool) -> None:
+        """Upsert one date's items; the latest sample wins per (hour, context)."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO samples (date, hour, context, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (date, hour, context) DO UPDATE SET data = excluded.data",
+                [
+                    (
+                        day,
+                        int(item["hour"]),
+                        item["context"],
+                        json.dumps(item["data"], default=float),
+                    )
+                    for item in items
+                ],
+            )
+            self.connection.execute(
+                "INSERT INTO synced_dates (date, complete) VALUES (?, ?) "
+                "ON CONFLICT (date) DO UPDATE SET complete = excluded.complete",
+                (day, int(complete)),
+            )
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def load_dates(
+    archive: WeatherArchive,
+    dates: Iterable[str],
+    fetch: Callable[[list[str]], dict[str, list[dict]]] | None,
+) -> dict[str, list[dict]]:
+    """Items per date from the archive, fetching incomplete dates first.
+
+    fetch maps dates to their DynamoDB items; None reads the archive only
+    (offline), so dates never synced come back empty. A date becomes
+    complete only when fetched TTL_DAYS after it, so short or empty
+    answers for recent dates are retried on the next sync.
+    """
+    dates = sorted(set(dates))
+    missing = sorted(set(dates) - archive.complete_dates())
+    if missing and fetch is not None:
+        settled = (local_today() - timedelta(days=TTL_DAYS)).isoformat()
+        for day, items in fetch(missing).items():
+            archive.add(day, items, complete=day <= settled)
+    return {day: archive.items(day) for day in dates}
+
+
+def recent_dates(days: int = SYNC_DAYS) -> list[str]:
+    today = local_today()
+    return [(today - timedelta(days=offset)).isoformat() for offset in range(days)]
+
+
+def main(argv: list[str] | None = None) -> None:
+    from scripts import weather_traffic
+
+    parser = argparse.ArgumentParser(description="Mirror DynamoDB weather/traffic samples locally.")
+    parser.add_argument(
+        "command",
+        choices=["sync", "backfill"],
+        help="sync recent dates, or set context_hour on items missing from the date index",
+    )
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=SYNC_DAYS,
+        help="sync this many recent days (default: %(default)s)",
+    )
+    parser.add_argument("--archive", type=Path, default=ARCHIVE_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "backfill":
+        count = weather_traffic.backfill_context_hour(weather_traffic.thread_table())
+        print(f"set context_hour on {count} items")
+        return
+    archive = WeatherArchive(args.archive)
+    try:
+        loaded = load_dates(archive, recent_dates(args.days), weather_traffic.fetch_dates)
+    finally:
+        archive.close()
+    for day, items in loaded.items():
+        print(f"{day}: {len(items)} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,52 @@
+"""Add the weather and traffic samples around each activity from DynamoDB.
+
+Each date is read with one Query on the date-context_hour-index GSI, or a
+filtered scan for tables without it, projected to the fields the
+descriptions use. A date's items are decoded once into hour-sorted arrays
+per context and shared by every activity on that date; windows that cross
+midnight continue into the next date. Dates are fetched concurrently, each
+thread with its own boto3 table, and mirrored into the local archive.
+"""
+
 from __future__ import annotations
 
-import os
-from datetime import timedelta
-from decimal import Decimal
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import chain
 from pathlib import Path
 import random
+from typing import Callable, Iterable
 
-import boto3
-from boto3.dynamodb.conditions import Attr
+import numpy as np
 
-from scripts.utils import load_json, parse_iso, write_json
+from scripts import parallel, weather_archive
+from scripts.manifest import Manifest, digest_value
+from scripts.store import JsonStore
+from scripts.utils import parse_iso
 
 
 DATA_DIR = Path("data")
 ACTIVITIES_DIR = DATA_DIR / "activities"
+MANIFEST_PATH = DATA_DIR / "manifest.json"
+STAGE = "weather_traffic"
+SECTIONS = ("weather", "traffic")
 DYNAMODB_TABLE = "strava-activity-context-v2"
+DATE_INDEX = "date-context_hour-index"
+# Only the attributes the descriptions use; id, date, ttl and context_hour stay on the server.
+# hour, context and data are DynamoDB reserved words, hence the placeholders.
+PROJECTION = (
+    "#hour, #context, #data.weather_description, #data.feels_like, "
+    "#data.currentSpeed, #data.freeFlowSpeed"
+)
+ATTRIBUTE_NAMES = {"#hour": "hour", "#context": "context", "#data": "data"}
+# Concurrent DynamoDB queries when fetching several dates.
+FETCH_THREADS = 8
+# Tables whose date index is missing, so query_items scans them instead.
+_UNINDEXED_TABLES: set[str] = set()
+_local = threading.local()
 
 FEELS_LIKE_FREEZING = [
     "bone-chilling, rare Hanoi frost",
@@ -44,25 +76,101 @@ TRAFFIC_CRAWLING = [
 ]
 
 
-def filter_items_by_hour(
-    items: list[dict], start_hour: int, end_hour: int, context: str | None = None
-) -> list[dict]:
-    """Filter items by context and hour range (inclusive)."""
-    items = [
-        item
-        for item in items
-        if (context is None or item.get("context") == context)
-        and start_hour <= int(item["hour"]) <= end_hour
-    ]
-    items.sort(key=lambda item: int(item["hour"]))
-    return items
+@dataclass(frozen=True)
+class Samples:
+    """Samples of one context as arrays, hour-sorted within each date.
+
+    values holds feels_like (°C) for weather and currentSpeed / freeFlowSpeed
+    for traffic; descriptions is empty for traffic. values stay float64 so
+    ratios such as 16 / 40 compare against the description thresholds
+    exactly as Python floats do.
+    """
+
+    hours: np.ndarray
+    values: np.ndarray
+    descriptions: tuple[str, ...] = ()
+
+    def between(self, start_hour: int, end_hour: int) -> Samples:
+        """The samples from start_hour to end_hour (inclusive), found by bisection."""
+        start = int(np.searchsorted(self.hours, start_hour, side="left"))
+        end = int(np.searchsorted(self.hours, end_hour, side="right"))
+        return Samples(
+            self.hours[start:end], self.values[start:end], self.descriptions[start:end]
+        )
+
+    @classmethod
+    def concatenate(cls, parts: list[Samples]) -> Samples:
+        """Join consecutive dates' samples into one window."""
+        if len(parts) == 1:
+            return parts[0]
+        return cls(
+            np.concatenate([part.hours for part in parts] or [np.empty(0, np.int8)]),
+            np.concatenate([part.values for part in parts] or [np.empty(0, np.float64)]),
+            tuple(chain.from_iterable(part.descriptions for part in parts)),
+        )
+
+
+class SampleIndex:
+    """Samples bucketed per (date, context), built once per fetch and shared by activities.
 
+    Each bucket is hour-sorted, so a window is two bisections per date.
+    """
 
-def to_number(value: object) -> object:
-    """Convert DynamoDB Decimals to floats for math."""
-    if isinstance(value, Decimal):
-        return float(value)
-    return value
+    def __init__(self, samples: dict[tuple[str, str], Samples]) -> None:
+        self.samples = samples
+
+    @classmethod
+    def from_items(cls, items_by_date: dict[str, list[dict]]) -> SampleIndex:
+        return cls(
+            {
+                (date, context): samples
+                for date, items in items_by_date.items()
+                for context, samples in decode_items(items).items()
+            }
+        )
+
+    def window(self, context: str, start: datetime, end: datetime) -> Samples:
+        """Samples from start's hour to end's hour (inclusive), in time order.
+
+        Windows past midnight continue in the next dates' buckets.
+        """
+        parts = []
+        for day in window_dates(start, end):
+            samples = self.samples.get((day, context))
+            if samples is None:
+                continue
+            first = start.hour if day == start.date().isoformat() else 0
+            last = end.hour if day == end.date().isoformat() else 23
+            parts.append(samples.between(first, last))
+        return Samples.concatenate(parts)
+
+
+def decode_items(items: Iterable[dict]) -> dict[str, Samples]:
+    """Decode one date's items (Decimals or floats) into Samples per context."""
+    weather: list[tuple[int, float, str]] = []
+    traffic: list[tuple[int, float]] = []
+    for item in items:
+        data = item["data"]
+        if item["context"] == "weather":
+            weather.append(
+                (int(item["hour"]), float(data["feels_like"]), data["weather_description"])
+            )
+        elif item["context"] == "traffic":
+            ratio = float(data["currentSpeed"]) / float(data["freeFlowSpeed"])
+            traffic.append((int(item["hour"]), ratio))
+    weather.sort(key=lambda sample: sample[0])
+    traffic.sort(key=lambda sample: sample[0])
+    return {
+        "weather": Samples(
+            np.array([sample[0] for sample in weather], dtype=np.int8),
+            np.array([sample[1] for sample in weather], dtype=np.float64),
+            tuple(sample[2] for sample in weather),
+        ),
+        "traffic": Samples(
+            np.array([sample[0] for sample in traffic], dtype=np.int8),
+            np.array([sample[1] for sample in traffic], dtype=np.float64),
+        ),
+    }
 
 
 def feels_like_description(feels_like_c: float) -> str:
@@ -317,79 +425,256 @@ def traffic_description(speed_ratio: float) -> str:
     ])
 
 
-def build_weather_entries(items: list[dict]) -> list[dict]:
+def build_weather_entries(samples: Samples) -> list[dict]:
     return [
-        {
-            "description": item["data"]["weather_description"],
-            "feels_like": feels_like_description(
-                float(to_number(item["data"]["feels_like"]))
-            ),
-        }
-        for item in items
+        {"description": description, "feels_like": feels_like_description(float(feels_like))}
+        for description, feels_like in zip(samples.descriptions, samples.values)
     ]
 
 
-def build_traffic_entries(items: list[dict]) -> list[dict]:
-    return [
-        {
-            "description": traffic_description(
-                float(to_number(item["data"]["currentSpeed"]))
-                / float(to_number(item["data"]["freeFlowSpeed"]))
-            ),
-        }
-        for item in items
-    ]
+def build_traffic_entries(samples: Samples) -> list[dict]:
+    return [{"description": traffic_description(float(ratio))} for ratio in samples.values]
 
 
-def query_items(table, date: str) -> list[dict]:
+def scan_items(table, date: str) -> list[dict]:
     """Scan DynamoDB for a specific date, handling pagination."""
+    from boto3.dynamodb.conditions import Attr
+
     items = []
-    response = table.scan(FilterExpression=Attr("date").eq(date))
+    kwargs = {
+        "FilterExpression": Attr("date").eq(date),
+        "ProjectionExpression": PROJECTION,
+        "ExpressionAttributeNames": ATTRIBUTE_NAMES,
+    }
+    response = table.scan(**kwargs)
     items.extend(response.get("Items", []))
     while "LastEvaluatedKey" in response:
-        response = table.scan(
-            FilterExpression=Attr("date").eq(date),
-            ExclusiveStartKey=response["LastEvaluatedKey"],
-        )
+        response = table.scan(**kwargs, ExclusiveStartKey=response["LastEvaluatedKey"])
         items.extend(response.get("Items", []))
     return items
 
 
-def main() -> None:
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table(DYNAMODB_TABLE)
-    for activity_path in sorted(ACTIVITIES_DIR.glob("*.json")):
-        payload = load_json(activity_path)
-        if payload.get("weather") and payload.get("traffic"):
-            continue
-        activity = payload["activity"]
-        start_time = parse_iso(activity["start_date_local"])
-        end_time = (
-            start_time
-            + timedelta(seconds=activity["moving_time"])
-            + timedelta(hours=1)
-        )
-        date = start_time.date().isoformat()
-        start_hour = start_time.hour
-        end_hour = end_time.hour
+def query_index(table, date: str) -> list[dict]:
+    """Query the date index for one day's items, handling pagination."""
+    from boto3.dynamodb.conditions import Key
 
-        items: list[dict] | None = None
-        if not payload.get("weather") or not payload.get("traffic"):
-            items = query_items(table, date)
+    items = []
+    kwargs = {
+        "IndexName": DATE_INDEX,
+        "KeyConditionExpression": Key("date").eq(date),
+        "ProjectionExpression": PROJECTION,
+        "ExpressionAttributeNames": ATTRIBUTE_NAMES,
+    }
+    response = table.query(**kwargs)
+    items.extend(response.get("Items", []))
+    while "LastEvaluatedKey" in response:
+        response = table.query(**kwargs, ExclusiveStartKey=response["LastEvaluatedKey"])
+        items.extend(response.get("Items", []))
+    return items
 
-        if not payload.get("weather"):
-            weather_during_activity = filter_items_by_hour(
-                items or [], start_hour, end_hour, "weather"
-            )
-            payload["weather"] = build_weather_entries(weather_during_activity)
 
-        if not payload.get("traffic"):
-            traffic_during_activity = filter_items_by_hour(
-                items or [], start_hour, end_hour, "traffic"
+def backfill_context_hour(table) -> int:
+    """Set context_hour on items written before the date index; return how many.
+
+    The index is sparse, so such items are invisible to query_index until
+    they have the attribute.
+    """
+    from boto3.dynamodb.conditions import Attr
+
+    kwargs = {
+        "FilterExpression": Attr("context_hour").not_exists(),
+        "ProjectionExpression": "id, #date, #hour, #context",
+        "ExpressionAttributeNames": {"#date": "date", "#hour": "hour", "#context": "context"},
+    }
+    count = 0
+    response = table.scan(**kwargs)
+    while True:
+        for item in response.get("Items", []):
+            table.update_item(
+                Key={"id": item["id"], "date": item["date"]},
+                UpdateExpression="SET context_hour = :context_hour",
+                ExpressionAttributeValues={
+                    ":context_hour": f"{item['context']}#{int(item['hour']):02d}"
+                },
             )
-            payload["traffic"] = build_traffic_entries(traffic_during_activity)
+            count += 1
+        if "LastEvaluatedKey" not in response:
+            return count
+        response = table.scan(**kwargs, ExclusiveStartKey=response["LastEvaluatedKey"])
+
+
+def query_items(table, date: str) -> list[dict]:
+    """One date's items: a Query on the date index, or a scan for tables without it.
+
+    Items hold only hour, context and the data fields the descriptions use.
+    """
+    from botocore.exceptions import ClientError
+
+    if table.name not in _UNINDEXED_TABLES:
+        try:
+            return query_index(table, date)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] != "ValidationException":
+                raise
+            # The table predates the index; don't retry the Query for every date.
+            _UNINDEXED_TABLES.add(table.name)
+    return scan_items(table, date)
+
+
+def thread_table():
+    """The DynamoDB table for the calling thread; boto3 resources are not thread-safe."""
+    table = getattr(_local, "table", None)
+    if table is None:
+        import boto3
+
+        table = _local.table = boto3.session.Session().resource("dynamodb").Table(DYNAMODB_TABLE)
+    return table
+
+
+def fetch_dates(
+    dates: Iterable[str],
+    jobs: int = FETCH_THREADS,
+    get_table: Callable | None = None,
+    executor: ThreadPoolExecutor | None = None,
+) -> dict[str, list[dict]]:
+    """Items per distinct date, with up to jobs queries in flight at once.
+
+    get_table (default: thread_table) is called on the worker thread, so each
+    one can use its own handle. Pass a long-lived executor to keep those
+    handles between calls; otherwise a pool is created per call.
+    """
+    get_table = get_table or thread_table
+    dates = sorted(set(dates))
+    fetched = parallel.run_tasks(
+        lambda date: query_items(get_table(), date),
+        [(date,) for date in dates],
+        jobs,
+        "thread",
+        executor=executor,
+    )
+    return dict(zip(dates, fetched))
+
+
+def load_samples(
+    archive: weather_archive.WeatherArchive,
+    dates: Iterable[str],
+    fetch: Callable[[list[str]], dict[str, list[dict]]] | None,
+) -> SampleIndex:
+    """The samples of dates, synced through the archive (see load_dates)."""
+    return SampleIndex.from_items(weather_archive.load_dates(archive, dates, fetch))
+
+
+def activity_window(activity: dict) -> tuple[datetime, datetime]:
+    """Local start and end of the sampled window: the run plus one hour."""
+    start_time = parse_iso(activity["start_date_local"])
+    return start_time, start_time + timedelta(seconds=activity["moving_time"], hours=1)
+
+
+def window_dates(start: datetime, end: datetime) -> list[str]:
+    """The local dates from start to end (inclusive)."""
+    days = (end.date() - start.date()).days
+    return [(start.date() + timedelta(days=offset)).isoformat() for offset in range(days + 1)]
+
+
+def pending_dates(
+    payloads: Iterable[tuple[str, dict]], manifest: Manifest
+) -> dict[str, list[str]]:
+    """Local dates covered by each activity whose samples need refreshing."""
+    return {
+        activity_id: window_dates(*activity_window(payload["activity"]))
+        for activity_id, payload in payloads
+        if needs_refresh(activity_id, payload, manifest)
+    }
+
 
-        write_json(activity_path, payload)
+def unique_dates(pending: dict[str, list[str]]) -> list[str]:
+    return sorted(set(chain.from_iterable(pending.values())))
+
+
+def stage_inputs(activity: dict) -> dict[str, str]:
+    return {
+        "activity": digest_value(
+            {key: activity.get(key) for key in ("start_date_local", "moving_time")}
+        )
+    }
+
+
+def needs_refresh(activity_id: str, payload: dict, manifest: Manifest) -> bool:
+    """True when the activity window changed or its samples are missing."""
+    has_output = bool(payload.get("weather") and payload.get("traffic"))
+    return manifest.is_stale(activity_id, STAGE, stage_inputs(payload["activity"]), has_output)
+
+
+def refresh_weather_traffic(
+    activity_id: str,
+    payload: dict,
+    manifest: Manifest,
+    samples: SampleIndex,
+) -> bool:
+    """Fill weather/traffic samples for the activity window.
+
+    samples must cover the activity's pending_dates. Returns True when the
+    payload was modified.
+    """
+    if not needs_refresh(activity_id, payload, manifest):
+        return False
+    activity = payload["activity"]
+    inputs = stage_inputs(activity)
+    if manifest.inputs(activity_id, STAGE) is not None:
+        # The activity window changed since the last fetch.
+        payload.pop("weather", None)
+        payload.pop("traffic", None)
+    start_time, end_time = activity_window(activity)
+
+    if not payload.get("weather"):
+        payload["weather"] = build_weather_entries(
+            samples.window("weather", start_time, end_time)
+        )
+
+    if not payload.get("traffic"):
+        payload["traffic"] = build_traffic_entries(
+            samples.window("traffic", start_time, end_time)
+        )
+
+    # Empty samples are retried on the next run.
+    if payload["weather"] and payload["traffic"]:
+        manifest.record(activity_id, STAGE, inputs)
+    return True
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Add weather/traffic samples to activities.")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=FETCH_THREADS,
+        help="concurrent DynamoDB queries (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--offline", action="store_true", help="read samples from the local archive only"
+    )
+    args = parser.parse_args(argv)
+
+    manifest = Manifest.load(MANIFEST_PATH)
+    store = JsonStore(ACTIVITIES_DIR)
+    # Group pending activities by date, so each date is fetched once.
+    dates = pending_dates(
+        ((activity_id, store.load(activity_id)) for activity_id in store.ids()), manifest
+    )
+    archive = weather_archive.WeatherArchive(weather_archive.ARCHIVE_PATH)
+    try:
+        samples = load_samples(
+            archive,
+            unique_dates(dates),
+            None if args.offline else lambda missing: fetch_dates(missing, args.jobs),
+        )
+    finally:
+        archive.close()
+    for activity_id in dates:
+        payload = store.load(activity_id)
+        if refresh_weather_traffic(activity_id, payload, manifest, samples):
+            store.save(activity_id, payload, SECTIONS)
+    manifest.save()
 
 
 if __name__ == "__main__":
@@ -14,8 +14,21 @@ resource "aws_dynamodb_table" "activity_context" {
     type = "S"
   }
 
+  attribute {
+    name = "context_hour"
+    type = "S"
+  }
+
+  # One day's samples in a single Query, sorted by "<context>#<HH>".
+  global_secondary_index {
+    name            = var.dynamodb_date_index_name
+    hash_key        = "date"
+    range_key       = "context_hour"
+    projection_type = "ALL"
+  }
+
   ttl {
     attribute_name = "ttl"
     enabled        = true
   }
-}
\ No newline at end of file
+}
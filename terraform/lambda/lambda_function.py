@@ -94,6 +94,7 @@ def lambda_handler(event, context):
             "context": "weather",
             "date": date,
             "hour": hour,
+            "context_hour": f"weather#{hour:02d}",
             "data": {
                 "feels_like": feels_like,
                 "weather_description": weather_description,
@@ -111,6 +112,7 @@ def lambda_handler(event, context):
             "context": "traffic",
             "date": date,
             "hour": hour,
+            "context_hour": f"traffic#{hour:02d}",
             "data": {
                 "currentSpeed": Decimal(str(traffic["currentSpeed"])),
                 "freeFlowSpeed": Decimal(str(traffic["freeFlowSpeed"])),
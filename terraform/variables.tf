@@ -13,6 +13,11 @@ variable "dynamodb_table_name" {
   default = "strava-activity-context-v2"
 }
 
+variable "dynamodb_date_index_name" {
+  type    = string
+  default = "date-context_hour-index"
+}
+
 variable "ttl_days" {
   type    = number
   default = 2
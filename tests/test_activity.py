@@ -1,30 +1,44 @@
-from datetime import datetime, timedelta, timezone
+import math
+from datetime import datetime, timezone
 
 from pathlib import Path
 
-from scripts.activity import activity_payload, parse_points, simplify_points
-
-
-def make_point(lat: float, lon: float, ele: str, time: datetime) -> dict:
-    return {
-        "lat": lat,
-        "lon": lon,
-        "ele": ele,
-        "time": time,
-    }
+import numpy as np
+import pytest
+from geopy.distance import distance as geo_distance
+
+from scripts.activity import (
+    Track,
+    activity_payload,
+    load_track,
+    parse_points,
+    simplify_points,
+    total_distance_m,
+    write_track,
+)
+
+START_MS = int(datetime(2026, 1, 1, 0, 0, 0, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def make_track(coords: list[tuple[float, float]]) -> Track:
+    count = len(coords)
+    return Track(
+        lat=np.array([lat for lat, _ in coords], dtype=np.float64),
+        lon=np.array([lon for _, lon in coords], dtype=np.float64),
+        time_ms=START_MS + 1000 * np.arange(count, dtype=np.int64),
+        ele=np.zeros(count, dtype=np.float32),
+        hr=np.full(count, np.nan, dtype=np.float32),
+        cad=np.full(count, np.nan, dtype=np.float32),
+    )
 
 
 def test_activity_payload() -> None:
-    start = datetime(2026, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
-    points = [
-        make_point(0.0, 0.0, "0", start),
-        make_point(0.0, 0.00001, "10", start + timedelta(seconds=1)),
-        make_point(0.0, 0.00002, "0", start + timedelta(seconds=2)),
-    ]
+    track = make_track([(0.0, 0.0), (0.0, 0.00001), (0.0, 0.00002)])
 
-    payload = activity_payload(points)
+    payload = activity_payload(track)
 
     assert payload["activity"]["start_date"] == "2026-01-01T00:00:00Z"
+    assert payload["activity"]["moving_time"] == 2
 
 
 def test_parse_points_reads_track_data(tmp_path: Path) -> None:
@@ -45,28 +59,45 @@ def test_parse_points_reads_track_data(tmp_path: Path) -> None:
         encoding="utf-8",
     )
 
-    points = parse_points(gpx_path)
+    track = parse_points(gpx_path)
 
-    assert points == [
-        {
-            "lat": 1.0,
-            "lon": 2.0,
-            "ele": "3",
-            "time": datetime(2026, 1, 1, 0, 0, 0, tzinfo=timezone.utc),
-        }
-    ]
+    assert len(track) == 1
+    assert (track.lat[0], track.lon[0], track.ele[0]) == (1.0, 2.0, 3.0)
+    assert track.time_at(0) == datetime(2026, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+    assert math.isnan(track.hr[0]) and math.isnan(track.cad[0])
 
 
 def test_simplify_points_with_zero_distance() -> None:
-    start = datetime(2026, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
-    points = [
-        make_point(1.0, 2.0, "0", start),
-        make_point(1.0, 2.00001, "0", start + timedelta(seconds=1)),
-        make_point(1.0, 2.00002, "0", start + timedelta(seconds=2)),
-    ]
-
-    simplified = simplify_points(points, 0)
-
-    assert simplified[0] == points[0]
-    assert simplified[-1] == points[-1]
-    assert all(point in points for point in simplified)
+    track = make_track([(1.0, 2.0), (1.0, 2.00001), (1.0, 2.00002)])
+
+    simplified = simplify_points(track, 0)
+
+    assert simplified.time_ms[0] == track.time_ms[0]
+    assert simplified.time_ms[-1] == track.time_ms[-1]
+    assert set(simplified.time_ms.tolist()) <= set(track.time_ms.tolist())
+
+
+@pytest.mark.parametrize(("method", "rel_tolerance"), [("haversine", 5e-3), ("geodesic", 1e-9)])
+def test_total_distance_m_matches_geopy(method: str, rel_tolerance: float) -> None:
+    coords = [(21.0, 105.8), (21.001, 105.8012), (21.0035, 105.8009), (21.004, 105.805)]
+    expected = sum(geo_distance(a, b).meters for a, b in zip(coords, coords[1:]))
+
+    assert total_distance_m(make_track(coords), method=method) == pytest.approx(
+        expected, rel=rel_tolerance
+    )
+    assert total_distance_m(make_track(coords[:1]), method=method) == 0.0
+
+
+def test_track_cache_round_trip_is_memory_mapped(tmp_path: Path) -> None:
+    track = make_track([(21.0, 105.8), (21.001, 105.8012), (21.0035, 105.8009)])
+    track.hr[1] = 150
+    path = tmp_path / "track.npy"
+
+    write_track(path, track)
+    loaded = load_track(path)
+
+    assert list(tmp_path.iterdir()) == [path]
+    assert isinstance(loaded.lat.base, np.memmap)
+    for name in ("lat", "lon", "time_ms", "ele", "hr", "cad"):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(track, name))
+    assert loaded.time_at(-1) == track.time_at(-1)
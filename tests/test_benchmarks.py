@@ -0,0 +1,42 @@
+import pytest
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from benchmarks import stages
+from benchmarks.generators import FakeTable, dynamodb_items, history_starts
+
+
+def test_fake_table_pages_scans_and_queries() -> None:
+    dates = [start.date() for start in history_starts(3)]
+    table = FakeTable(dynamodb_items(dates), page_size=100)
+
+    first = table.scan()
+    second = table.scan(ExclusiveStartKey=first["LastEvaluatedKey"])
+    assert len(first["Items"]) == 100 and len(second["Items"]) == 44
+    assert "LastEvaluatedKey" not in second
+    page = table.query("date-context_hour-index", Key("date").eq(dates[1].isoformat()))
+    assert len(page["Items"]) == 48 and "LastEvaluatedKey" not in page
+    assert table.scans == 2 and table.queries == 1
+
+    with pytest.raises(ClientError):
+        FakeTable([], indexes=()).query("date-context_hour-index", Key("date").eq("2026-01-01"))
+
+
+def test_run_once_times_every_stage() -> None:
+    report = stages.run_once(activities=2, points=120, osm_nodes=200)
+
+    assert list(report["stages"]) == [
+        "merge", "activity", "weather_traffic", "context", "poi", "uniqueness",
+    ]
+    assert report["stages"]["merge"]["items"] == 2
+    assert report["stages"]["activity"]["items"] == 2
+
+
+def test_regressions_ignore_noise_and_flag_slow_stages() -> None:
+    baseline = {"5x1800": {"merge": 1.0, "context": 0.001}}
+    results = {"5x1800": {"merge": 1.3, "context": 0.01}}
+
+    assert stages.regressions(results, baseline, margin=0.25) == [
+        "5x1800 merge: 1.300s vs baseline 1.000s"
+    ]
+    assert stages.regressions(results, baseline, margin=0.5) == []
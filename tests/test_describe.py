@@ -1,3 +1,5 @@
+import subprocess
+import sys
 from datetime import datetime
 
 import polyline
@@ -91,3 +93,16 @@ def test_render_activity_context_includes_header() -> None:
     rendered = render_activity_context(inputs)
 
     assert "ACTIVITY CONTEXT" in rendered
+
+
+def test_entry_points_defer_heavy_imports() -> None:
+    code = (
+        "import sys, scripts.describe, scripts.pipeline; "
+        "print(sorted(name for name in ('crewai', 'yaml', 'geopy', 'boto3', 'pyproj', 'shapely', "
+        "'dotenv') if name in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+
+    assert output.strip() == "[]"
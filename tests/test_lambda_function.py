@@ -122,3 +122,5 @@ def test_lambda_handler_stores_weather_and_traffic(monkeypatch) -> None:
     assert dynamo.table_name == "test-table"
     assert len(table.items) == 2
     assert {item["context"] for item in table.items} == {"weather", "traffic"}
+    for item in table.items:
+        assert item["context_hour"] == f"{item['context']}#{item['hour']:02d}"
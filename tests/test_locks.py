@@ -0,0 +1,82 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from scripts.locks import LEASE_SECONDS, LeaseLost, claim
+from scripts.store import JsonStore
+
+
+def test_claim_is_exclusive_until_released(tmp_path: Path) -> None:
+    lease = claim(tmp_path, "describe-a")
+
+    assert lease is not None
+    assert claim(tmp_path, "describe-a") is None
+    assert claim(tmp_path, "describe-b") is not None
+
+    lease.release()
+    assert claim(tmp_path, "describe-a") is not None
+
+
+def test_expired_lease_is_taken_over(tmp_path: Path) -> None:
+    path = tmp_path / "describe-a.lease"
+    path.write_text(json.dumps({"owner": "gone:1", "expires": time.time() - 1}), encoding="utf-8")
+
+    lease = claim(tmp_path, "describe-a")
+
+    assert lease is not None
+    assert json.loads(path.read_text(encoding="utf-8"))["owner"] == lease.owner
+
+
+def test_release_keeps_a_lease_taken_over_by_someone_else(tmp_path: Path) -> None:
+    lease = claim(tmp_path, "describe-a")
+    lease.path.write_text(json.dumps({"owner": "other:2", "expires": time.time() + 60}))
+
+    lease.release()
+
+    assert lease.path.exists()
+
+
+def test_renew_extends_the_lease_until_taken_over(tmp_path: Path) -> None:
+    lease = claim(tmp_path, "describe-a", seconds=1)
+
+    lease.renew()
+
+    assert json.loads(lease.path.read_text())["expires"] > time.time() + LEASE_SECONDS - 60
+    lease.path.write_text(json.dumps({"owner": "other:2", "expires": time.time() + 60}))
+    with pytest.raises(LeaseLost):
+        lease.renew()
+
+
+def test_partial_lease_expires_a_lease_period_after_creation(tmp_path: Path) -> None:
+    path = tmp_path / "describe-a.lease"
+    path.write_text("", encoding="utf-8")
+
+    assert claim(tmp_path, "describe-a") is None
+    created = time.time() - LEASE_SECONDS - 1
+    os.utime(path, (created, created))
+    assert claim(tmp_path, "describe-a") is not None
+
+
+def save_section(directory: Path, name: str, count: int) -> None:
+    store = JsonStore(directory)
+    for value in range(count):
+        store.save("a", {name: value}, [name])
+
+
+def test_section_saves_from_several_processes_are_not_lost(tmp_path: Path) -> None:
+    JsonStore(tmp_path / "activities").save("a", {"activity": {}})
+    names = ["weather", "geo", "activity_context"]
+
+    with ProcessPoolExecutor(max_workers=len(names)) as executor:
+        list(executor.map(save_section, [tmp_path / "activities"] * 3, names, [50] * 3))
+
+    assert JsonStore(tmp_path / "activities").load("a") == {
+        "activity": {},
+        "weather": 49,
+        "geo": 49,
+        "activity_context": 49,
+    }
@@ -0,0 +1,80 @@
+import json
+from pathlib import Path
+
+from scripts import context
+from scripts.manifest import Manifest, digest_value
+
+
+def test_digest_value_ignores_key_order() -> None:
+    assert digest_value({"a": 1, "b": [2]}) == digest_value({"b": [2], "a": 1})
+    assert digest_value({"a": 1}) != digest_value({"a": 2})
+
+
+def test_is_stale_adopts_existing_outputs_and_detects_changes(tmp_path: Path) -> None:
+    manifest = Manifest(tmp_path / "manifest.json")
+
+    assert manifest.is_stale("1", "context", {"goals": "a"}, has_output=False)
+    assert not manifest.is_stale("2", "context", {"goals": "a"}, has_output=True)
+    assert not manifest.is_stale("2", "context", {"goals": "a"}, has_output=True)
+    assert manifest.is_stale("2", "context", {"goals": "b"}, has_output=True)
+
+    manifest.save()
+    assert Manifest.load(tmp_path / "manifest.json").inputs("2", "context") == {"goals": "a"}
+
+
+def test_file_digest_tracks_content_changes(tmp_path: Path) -> None:
+    path = tmp_path / "goals.json"
+    path.write_text("{}", encoding="utf-8")
+    manifest = Manifest(tmp_path / "manifest.json")
+
+    first = manifest.file_digest(path)
+    path.write_text('{"distance": 1}', encoding="utf-8")
+
+    assert manifest.file_digest(path) != first
+
+
+def test_context_main_recomputes_only_when_goals_change(tmp_path: Path, monkeypatch) -> None:
+    activities_dir = tmp_path / "activities"
+    activities_dir.mkdir()
+    goals_path = tmp_path / "goals.json"
+    goals_path.write_text(json.dumps({"distance": 10.0}), encoding="utf-8")
+    activity_path = activities_dir / "1.json"
+    activity_path.write_text(json.dumps({"activity": {"distance": 10.0}}), encoding="utf-8")
+    monkeypatch.setattr(context, "ACTIVITIES_DIR", activities_dir)
+    monkeypatch.setattr(context, "GOALS_PATH", goals_path)
+    monkeypatch.setattr(context, "MANIFEST_PATH", tmp_path / "manifest.json")
+
+    context.main()
+    assert json.loads(activity_path.read_text())["activity_context"] == {"distance": "ultra"}
+
+    activity_path.write_text(
+        json.dumps({"activity": {"distance": 10.0}, "activity_context": {"distance": "kept"}}),
+        encoding="utf-8",
+    )
+    context.main()
+    assert json.loads(activity_path.read_text())["activity_context"] == {"distance": "kept"}
+
+    goals_path.write_text(json.dumps({"distance": 20.0, "moving_time": 1}), encoding="utf-8")
+    context.main()
+    assert json.loads(activity_path.read_text())["activity_context"] == {"distance": "solid"}
+
+
+def test_concurrent_manifests_merge_on_save(tmp_path: Path) -> None:
+    path = tmp_path / "manifest.json"
+    Manifest(path).save()
+    first = Manifest.load(path)
+    second = Manifest.load(path)
+
+    first.record("1", "context", {"goals": "a"})
+    first.save()
+    second.record("2", "context", {"goals": "b"})
+    second.record("1", "poi", {"osm": "c"})
+    second.save()
+
+    merged = Manifest.load(path)
+    assert merged.inputs("1", "context") == {"goals": "a"}
+    assert merged.inputs("1", "poi") == {"osm": "c"}
+    assert merged.inputs("2", "context") == {"goals": "b"}
+
+    first.sync()
+    assert first.inputs("2", "context") == {"goals": "b"}
@@ -1,10 +1,23 @@
 import xml.etree.ElementTree as ET
 from datetime import datetime, timezone
+from pathlib import Path
 
+import numpy as np
+import pytest
+
+from benchmarks import generators
+from scripts import merge
+from scripts.manifest import Manifest
 from scripts.merge import (
     GpxPoint,
     list_files,
+    indexed_time_range,
+    merge_is_stale,
+    iter_elements,
+    join_indices,
+    overlapping_files,
     parse_gpx,
+    parse_tcx,
     parse_time,
     time_key,
     write_gpx,
@@ -33,6 +46,91 @@ def test_write_gpx_writes_points(tmp_path) -> None:
     assert trkpt.findtext("{*}time") == "2026-01-01T00:00:00Z"
 
 
+def test_write_gpx_leaves_the_old_output_when_it_fails(tmp_path: Path) -> None:
+    good = GpxPoint(lat="1.0", lon="2.0", ele=None, time="t", time_key="t")
+    output = tmp_path / "activity.gpx"
+    output.write_text("old", encoding="utf-8")
+
+    broken = GpxPoint(lat=None, lon="2.0", ele=None, time="u", time_key="u")
+    with pytest.raises(AttributeError):
+        write_gpx([good, broken], {}, output)
+
+    assert output.read_text(encoding="utf-8") == "old"
+    assert list(tmp_path.iterdir()) == [output]
+
+
+def test_unrecorded_output_is_adopted_with_its_inputs(tmp_path: Path) -> None:
+    manifest = Manifest(tmp_path / "manifest.json")
+    raw_gpx, tcx = tmp_path / "a.gpx", tmp_path / "a.tcx"
+    generators.write_gpx(raw_gpx, 30)
+    generators.write_tcx(tcx, 30)
+    output = tmp_path / "activity.gpx"
+    output.write_bytes(raw_gpx.read_bytes())
+    ranges = merge.gpx_time_ranges([raw_gpx], {})
+
+    assert not merge_is_stale(manifest, tcx, output, 0, ranges)
+    assert manifest.inputs(output.stem, merge.STAGE)["gpx_file"] == "a.gpx"
+    generators.write_tcx(tcx, 30, seed=1)
+    assert merge_is_stale(manifest, tcx, output, 0, ranges)
+
+
+def test_truncated_unrecorded_output_is_merged_again(tmp_path: Path) -> None:
+    manifest = Manifest(tmp_path / "manifest.json")
+    output = tmp_path / "activity.gpx"
+    generators.write_gpx(output, 30)
+    output.write_bytes(output.read_bytes()[:-20])
+
+    assert merge_is_stale(manifest, tmp_path / "a.tcx", output, 0)
+    assert merge_is_stale(manifest, tmp_path / "a.tcx", tmp_path / "missing.gpx", 0)
+    assert manifest.inputs(output.stem, merge.STAGE) is None
+
+
+def write_gpx_with_element_tree(points, tcx_data, output) -> None:
+    """The original tree-based writer that write_gpx must match byte for byte."""
+    ns = "{http://www.topografix.com/GPX/1/1}"
+    ext_ns = "{http://www.garmin.com/xmlschemas/TrackPointExtension/v1}"
+    ET.register_namespace("", ns[1:-1])
+    ET.register_namespace("gpxtpx", ext_ns[1:-1])
+    gpx = ET.Element(f"{ns}gpx", {"version": "1.1", "creator": "merge_tcx_gpx"})
+    seg = ET.SubElement(ET.SubElement(gpx, f"{ns}trk"), f"{ns}trkseg")
+    for point in points:
+        trkpt = ET.SubElement(seg, f"{ns}trkpt", {"lat": point.lat, "lon": point.lon})
+        if point.ele is not None:
+            ET.SubElement(trkpt, f"{ns}ele").text = point.ele
+        ET.SubElement(trkpt, f"{ns}time").text = point.time
+        hr, cad = tcx_data.get(point.time_key, (None, None))
+        if hr is not None or cad is not None:
+            tpe = ET.SubElement(ET.SubElement(trkpt, f"{ns}extensions"), f"{ext_ns}TrackPointExtension")
+            if hr is not None:
+                ET.SubElement(tpe, f"{ext_ns}hr").text = str(hr)
+            if cad is not None:
+                ET.SubElement(tpe, f"{ext_ns}cad").text = str(cad)
+    tree = ET.ElementTree(gpx)
+    ET.indent(tree, space="  ")
+    tree.write(output, encoding="utf-8", xml_declaration=True)
+
+
+@pytest.mark.parametrize(
+    "tcx_data",
+    [
+        {},
+        {"2026-01-01T00:00:00Z": (120, None), "2026-01-01T00:00:02Z": (None, 80)},
+    ],
+)
+@pytest.mark.parametrize("count", [0, 3])
+def test_write_gpx_matches_element_tree_output(tmp_path, tcx_data, count) -> None:
+    points = [
+        GpxPoint(lat="1.0", lon='2&"<', ele="3", time="t", time_key="2026-01-01T00:00:00Z"),
+        GpxPoint(lat="1.5", lon="2.5", ele=None, time="a<b", time_key="2026-01-01T00:00:01Z"),
+        GpxPoint(lat="1.7", lon="2.7", ele="", time="x", time_key="2026-01-01T00:00:02Z"),
+    ][:count]
+
+    write_gpx(points, tcx_data, tmp_path / "stream.gpx")
+    write_gpx_with_element_tree(points, tcx_data, tmp_path / "tree.gpx")
+
+    assert (tmp_path / "stream.gpx").read_bytes() == (tmp_path / "tree.gpx").read_bytes()
+
+
 def test_parse_time_and_key() -> None:
     parsed = parse_time("2026-01-01T00:00:00Z")
 
@@ -79,3 +177,132 @@ def test_parse_gpx_reads_points(tmp_path) -> None:
             time_key="2026-01-01T00:00:00Z",
         )
     ]
+
+
+def test_parse_tcx_reads_samples(tmp_path) -> None:
+    tcx_path = tmp_path / "sample.tcx"
+    tcx_path.write_text(
+        """<?xml version="1.0" encoding="UTF-8"?>
+<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">
+  <Activities><Activity Sport="Running"><Lap><Track>
+    <Trackpoint>
+      <Time>2026-01-01T00:00:00.505Z</Time>
+      <HeartRateBpm><Value>120</Value></HeartRateBpm>
+      <Cadence>80</Cadence>
+    </Trackpoint>
+    <Trackpoint>
+      <Time>2026-01-01T00:00:01.505Z</Time>
+    </Trackpoint>
+  </Track></Lap></Activity></Activities>
+</TrainingCenterDatabase>
+""",
+        encoding="utf-8",
+    )
+
+    assert parse_tcx(tcx_path) == {
+        "2026-01-01T00:00:00Z": (120, 80),
+        "2026-01-01T00:00:01Z": (None, None),
+    }
+
+
+def test_iter_elements_clears_consumed_elements(tmp_path) -> None:
+    path = tmp_path / "sample.xml"
+    path.write_text("<root><seg><pt/><pt/><pt/></seg></root>", encoding="utf-8")
+
+    seen = []
+    for element in iter_elements(path, "pt"):
+        seen.append(element)
+
+    assert len(seen) == 3
+    assert all(len(element) == 0 and not element.attrib for element in seen)
+
+
+def write_track(path, times: list[str]) -> None:
+    trkpts = "".join(
+        f'<trkpt lat="1.0" lon="2.0"><time>{value}</time></trkpt>' for value in times
+    )
+    path.write_text(
+        f'<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>{trkpts}</trkseg></trk></gpx>',
+        encoding="utf-8",
+    )
+
+
+def test_indexed_time_range_reuses_and_invalidates_entries(tmp_path) -> None:
+    path = tmp_path / "a.gpx"
+    write_track(path, ["2026-01-01T00:00:05Z", "2026-01-01T00:00:01Z"])
+    index: dict[str, dict] = {}
+
+    assert indexed_time_range(index, path) == ("2026-01-01T00:00:01Z", "2026-01-01T00:00:05Z")
+
+    index["a.gpx"]["start"] = "cached"
+    assert indexed_time_range(index, path)[0] == "cached"
+
+    write_track(path, ["2026-01-02T00:00:00Z", "2026-01-02T00:00:01Z", "2026-01-02T00:00:02Z"])
+    assert indexed_time_range(index, path) == ("2026-01-02T00:00:00Z", "2026-01-02T00:00:02Z")
+
+
+def test_overlapping_files_returns_candidates_in_name_order() -> None:
+    ranges = sorted(
+        [
+            ("2026-01-01T00:00:00Z", "2026-01-01T01:00:00Z", Path("b.gpx")),
+            ("2026-01-01T00:30:00Z", "2026-01-01T02:00:00Z", Path("a.gpx")),
+            ("2026-01-01T03:00:00Z", "2026-01-01T04:00:00Z", Path("c.gpx")),
+            ("2025-12-31T00:00:00Z", "2025-12-31T01:00:00Z", Path("d.gpx")),
+        ]
+    )
+
+    span = ("2026-01-01T00:45:00Z", "2026-01-01T02:30:00Z")
+
+    assert overlapping_files(span, ranges) == [Path("a.gpx"), Path("b.gpx")]
+
+
+def write_tcx(path, times: list[str]) -> None:
+    trackpoints = "".join(
+        f"<Trackpoint><Time>{value}</Time><Cadence>80</Cadence></Trackpoint>" for value in times
+    )
+    path.write_text(
+        '<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">'
+        f"<Activities><Activity><Lap><Track>{trackpoints}</Track></Lap></Activity></Activities>"
+        "</TrainingCenterDatabase>",
+        encoding="utf-8",
+    )
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_main_reports_failures_and_merges_other_pairs(tmp_path, monkeypatch, capsys, jobs) -> None:
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    for day in ("01", "02"):
+        times = [f"2026-01-{day}T00:00:0{second}Z" for second in range(3)]
+        write_track(raw_dir / f"{day}.gpx", times)
+        write_tcx(raw_dir / f"{day}.tcx", times)
+    (raw_dir / "00.tcx").write_text("<TrainingCenterDatabase>", encoding="utf-8")
+    monkeypatch.setattr(merge, "RAW_DIR", raw_dir)
+    monkeypatch.setattr(merge, "OUT_DIR", tmp_path / "gpx")
+    monkeypatch.setattr(merge, "INDEX_PATH", tmp_path / "index.json")
+    monkeypatch.setattr(merge, "MANIFEST_PATH", tmp_path / "manifest.json")
+
+    with pytest.raises(SystemExit):
+        merge.main(["--jobs", jobs])
+
+    assert "merge failed for 00.tcx" in capsys.readouterr().err
+    outputs = sorted(path.name for path in (tmp_path / "gpx").iterdir())
+    assert outputs == sorted(
+        merge.output_path_for(Path(f"{day}.tcx"), tmp_path).name for day in ("01", "02")
+    )
+
+
+def test_join_indices_matches_whole_seconds_with_last_sample_winning() -> None:
+    gpx_ms = np.array([1_000, 2_000, 5_000], dtype=np.int64)
+    tcx_ms = np.array([2_900, 1_505, 2_100, 9_000], dtype=np.int64)
+
+    assert join_indices(gpx_ms, tcx_ms).tolist() == [1, 2, -1]
+
+
+def test_join_indices_nearest_within_tolerance() -> None:
+    gpx_ms = np.array([1_000, 2_000, 5_000], dtype=np.int64)
+    tcx_ms = np.array([1_400, 2_600, 1_700], dtype=np.int64)
+
+    assert join_indices(gpx_ms, tcx_ms, tolerance_ms=350).tolist() == [-1, 2, -1]
+    assert join_indices(gpx_ms, tcx_ms, tolerance_ms=500).tolist() == [0, 2, -1]
+    assert join_indices(gpx_ms, tcx_ms[:0], tolerance_ms=500).tolist() == [-1, -1, -1]
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from scripts.parallel import run_tasks
+
+
+def scaled(factor: int, value: int) -> int:
+    return factor * value
+
+
+def divide(value: int) -> float:
+    return 1 / value
+
+
+def slow_square(value: int) -> tuple[int, int]:
+    # Later tasks finish first, so ordering comes from run_tasks, not timing.
+    time.sleep(0.01 * (5 - value))
+    return value * value, os.getpid()
+
+
+_local = threading.local()
+_handles: list[object] = []
+
+
+def thread_handle(value: int) -> int:
+    # Stands in for a per-thread boto3 table.
+    if not hasattr(_local, "handle"):
+        _local.handle = object()
+        _handles.append(_local.handle)
+    time.sleep(0.01)
+    return value
+
+
+def test_run_tasks_keeps_task_order_across_processes() -> None:
+    results = run_tasks(slow_square, [(value,) for value in range(5)], jobs=3)
+
+    assert [square for square, _ in results] == [0, 1, 4, 9, 16]
+    assert {pid for _, pid in results} != {os.getpid()}
+
+
+def test_run_tasks_passes_shared_data_first() -> None:
+    tasks = [(value,) for value in range(4)]
+
+    assert run_tasks(scaled, tasks, shared=10) == [0, 10, 20, 30]
+    assert run_tasks(scaled, tasks, jobs=2, shared=10) == [0, 10, 20, 30]
+    assert run_tasks(scaled, tasks, jobs=2, kind="thread", shared=3) == [0, 3, 6, 9]
+
+
+def test_run_tasks_raises_task_errors() -> None:
+    with pytest.raises(ZeroDivisionError):
+        run_tasks(divide, [(1,), (0,)], jobs=2)
+
+
+def test_run_tasks_reuses_a_long_lived_thread_pool() -> None:
+    _handles.clear()
+    tasks = [(value,) for value in range(6)]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for _ in range(3):
+            assert run_tasks(thread_handle, tasks, 2, "thread", executor=executor) == list(range(6))
+
+    # Each call of a per-call pool would build new handles; the shared pool keeps two.
+    assert len(_handles) == 2
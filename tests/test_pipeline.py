@@ -0,0 +1,137 @@
+import json
+from pathlib import Path
+
+from scripts import activity, context, pipeline, poi, weather_archive, weather_traffic
+from scripts.profiling import Profiler
+from scripts.store import SqliteStore
+from scripts.utils import load_json
+
+
+def write_gpx(path: Path, start: str, lats: list[float]) -> None:
+    points = "".join(
+        f'<trkpt lat="{lat}" lon="105.8"><ele>10</ele><time>{start}:{second:02d}Z</time></trkpt>'
+        for second, lat in enumerate(lats)
+    )
+    path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">'
+        f"<trk><trkseg>{points}</trkseg></trk></gpx>",
+        encoding="utf-8",
+    )
+
+
+def setup_tree(tmp_path: Path, monkeypatch) -> dict[str, list[str]]:
+    gpx_dir = tmp_path / "gpx"
+    gpx_dir.mkdir()
+    write_gpx(gpx_dir / "a.gpx", "2026-01-01T06:00", [21.0, 21.001, 21.002])
+    write_gpx(gpx_dir / "b.gpx", "2026-02-01T06:00", [21.0, 21.0, 21.003])
+    goals_path = tmp_path / "goals.json"
+    goals_path.write_text(json.dumps({"distance": 10.0}), encoding="utf-8")
+    osm_path = tmp_path / "city.osm"
+    osm_path.write_text("<osm></osm>", encoding="utf-8")
+
+    monkeypatch.setattr(activity, "GPX_DIR", gpx_dir)
+    monkeypatch.setattr(activity, "OUTPUT_DIR", tmp_path / "activities")
+    monkeypatch.setattr(activity, "TRACKS_DIR", tmp_path / "tracks")
+    monkeypatch.setattr(activity, "MANIFEST_PATH", tmp_path / "manifest.json")
+    monkeypatch.setattr(context, "GOALS_PATH", goals_path)
+    monkeypatch.setattr(poi, "OSM_PATH", osm_path)
+    monkeypatch.setattr(weather_archive, "ARCHIVE_PATH", tmp_path / "weather.sqlite")
+
+    queried: list[str] = []
+
+    def fake_query_items(table, date: str) -> list[dict]:
+        queried.append(date)
+        return [
+            {"context": "weather", "hour": 6, "data": {"weather_description": "clear", "feels_like": 21}},
+            {"context": "traffic", "hour": 6, "data": {"currentSpeed": 30, "freeFlowSpeed": 40}},
+        ]
+
+    monkeypatch.setattr(weather_traffic, "query_items", fake_query_items)
+    monkeypatch.setattr(pipeline.Pipeline, "table", lambda self: None)
+    return {"queried": queried}
+
+
+def test_pipeline_runs_all_stages_and_is_idempotent(tmp_path: Path, monkeypatch) -> None:
+    state = setup_tree(tmp_path, monkeypatch)
+
+    changed = pipeline.Pipeline().run()
+
+    assert changed == ["a", "b"]
+    payload = load_json(tmp_path / "activities" / "a.json")
+    assert {"activity", "weather", "traffic", "uniqueness", "activity_context", "geo"} <= set(payload)
+    assert (tmp_path / "tracks" / "a.npy").exists()
+    assert sorted(state["queried"]) == ["2026-01-01", "2026-02-01"]
+
+    assert pipeline.Pipeline().run() == []
+
+
+def test_pipeline_filters_by_id_and_date(tmp_path: Path, monkeypatch) -> None:
+    setup_tree(tmp_path, monkeypatch)
+
+    assert pipeline.Pipeline().run(only={"a"}) == ["a"]
+    assert not (tmp_path / "activities" / "b.json").exists()
+
+    assert pipeline.Pipeline().run(since="2026-01-15") == ["b"]
+    assert "weather" in load_json(tmp_path / "activities" / "b.json")
+
+
+def test_pipeline_profile_reports_each_stage(tmp_path: Path, monkeypatch) -> None:
+    setup_tree(tmp_path, monkeypatch)
+    profiler = Profiler(enabled=True)
+
+    pipeline.Pipeline().run(profiler=profiler)
+
+    stages = profiler.report()["stages"]
+    assert list(stages) == ["activity", "weather_traffic", "context", "poi", "uniqueness"]
+    assert stages["activity"]["items"] == 2
+    assert set(stages["poi"]["activities"]) == {"a", "b"}
+
+
+def test_pipeline_writes_to_sqlite_store(tmp_path: Path, monkeypatch) -> None:
+    setup_tree(tmp_path, monkeypatch)
+    store = SqliteStore(tmp_path / "activities.sqlite")
+
+    assert pipeline.Pipeline().run(store=store) == ["a", "b"]
+    assert pipeline.Pipeline().run(store=store) == []
+
+    assert store.query(since="2026-01-15") == ["b"]
+    assert "weather" in store.load("a")
+    assert not (tmp_path / "activities").exists()
+    store.close()
+
+
+def test_parallel_pipeline_matches_serial_run(tmp_path: Path, monkeypatch) -> None:
+    serial_tree = tmp_path / "serial"
+    serial_tree.mkdir()
+    setup_tree(serial_tree, monkeypatch)
+    assert pipeline.Pipeline().run() == ["a", "b"]
+    serial = {name: load_json(serial_tree / "activities" / f"{name}.json") for name in "ab"}
+
+    parallel_tree = tmp_path / "parallel"
+    parallel_tree.mkdir()
+    state = setup_tree(parallel_tree, monkeypatch)
+    assert pipeline.Pipeline(jobs=2).run() == ["a", "b"]
+
+    for name in "ab":
+        payload = load_json(parallel_tree / "activities" / f"{name}.json")
+        # Weather and context descriptions pick their wording at random.
+        assert list(payload) == list(serial[name])
+        for section in ("activity", "uniqueness", "geo"):
+            assert payload[section] == serial[name][section]
+    assert sorted(state["queried"]) == ["2026-01-01", "2026-02-01"]
+    assert (parallel_tree / "tracks" / "b.npy").exists()
+    assert pipeline.Pipeline(jobs=2).run() == []
+
+
+def test_pipeline_batches_match_single_batch(tmp_path: Path, monkeypatch) -> None:
+    setup_tree(tmp_path, monkeypatch)
+    monkeypatch.setattr(pipeline, "BATCH_SIZE", 1)
+
+    assert pipeline.Pipeline().run() == ["a", "b"]
+
+    for name in "ab":
+        payload = load_json(tmp_path / "activities" / f"{name}.json")
+        assert payload["uniqueness"]["description"] is not None
+        assert "geo" in payload
+    assert pipeline.Pipeline().run() == []
@@ -1,4 +1,8 @@
+import polyline
+
+from scripts import poi
 from scripts.poi import extract_polyline, match_poi
+from scripts.store import JsonStore
 
 
 def test_match_poi_respects_priority() -> None:
@@ -14,3 +18,20 @@ def test_extract_polyline_handles_missing() -> None:
 def test_extract_polyline_reads_activity_map() -> None:
     activity = {"activity": {"map": {"polyline": "abc"}}}
     assert extract_polyline(activity) == "abc"
+
+
+def test_main_parses_an_empty_extract_once(tmp_path, monkeypatch) -> None:
+    osm_path = tmp_path / "empty.osm"
+    osm_path.write_text("<osm></osm>", encoding="utf-8")
+    store = JsonStore(tmp_path / "activities")
+    for activity_id in ("1", "2", "3"):
+        store.save(activity_id, {"activity": {"map": {"polyline": polyline.encode([(21.03, 105.85), (21.04, 105.86)])}}})
+    calls = []
+    monkeypatch.setattr(poi, "DATA_DIR", tmp_path / "activities")
+    monkeypatch.setattr(poi, "OSM_PATH", osm_path)
+    monkeypatch.setattr(poi, "MANIFEST_PATH", tmp_path / "manifest.json")
+    monkeypatch.setattr(poi, "load_pois", lambda path: calls.append(path) or [])
+
+    poi.main()
+
+    assert calls == [osm_path]
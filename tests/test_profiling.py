@@ -0,0 +1,35 @@
+import pstats
+from pathlib import Path
+
+from scripts.profiling import Profiler
+
+
+def test_profiler_records_stage_and_activity_metrics(tmp_path: Path) -> None:
+    profiler = Profiler(enabled=True, pstats_dir=tmp_path / "pstats")
+
+    with profiler.stage("activity"):
+        for activity_id in ("a", "b"):
+            with profiler.activity("activity", activity_id):
+                buffer = bytearray(1_000_000)
+                del buffer
+
+    stage = profiler.report()["stages"]["activity"]
+    assert stage["items"] == 2
+    assert set(stage["activities"]) == {"a", "b"}
+    assert stage["peak_bytes"] >= 1_000_000
+    assert stage["activities"]["a"]["peak_bytes"] >= 1_000_000
+    assert stage["wall_s"] >= stage["activities"]["a"]["wall_s"]
+    assert pstats.Stats(str(tmp_path / "pstats" / "activity.pstats")).total_calls > 0
+
+
+def test_disabled_profiler_records_nothing() -> None:
+    profiler = Profiler()
+
+    with profiler.stage("activity") as entry:
+        with profiler.activity("activity", "a"):
+            pass
+        entry["items"] = 3
+
+    stage = profiler.report()["stages"]["activity"]
+    assert stage["wall_s"] == 0.0
+    assert stage["activities"] == {}
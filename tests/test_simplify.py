@@ -0,0 +1,28 @@
+import numpy as np
+from shapely.geometry import LineString
+
+from scripts.simplify import METERS_PER_DEGREE, simplify_indices
+
+
+def test_simplify_indices_matches_shapely() -> None:
+    rng = np.random.default_rng(0)
+    heading = np.cumsum(rng.normal(0, 0.5, 2000))
+    step = rng.normal(3, 1, 2000) / METERS_PER_DEGREE
+    lats = 21.0 + np.cumsum(step * np.cos(heading))
+    lons = 105.8 + np.cumsum(step * np.sin(heading))
+
+    for tolerance_m in (0, 10, 35):
+        indices = simplify_indices(lats, lons, tolerance_m)
+        expected = LineString(np.column_stack([lons, lats])).simplify(
+            tolerance_m / METERS_PER_DEGREE, preserve_topology=False
+        )
+        assert list(zip(lons[indices], lats[indices])) == list(expected.coords)
+
+
+def test_simplify_indices_keeps_repeated_coordinates_distinct() -> None:
+    # An out-and-back route passes (0, 0.001) twice.
+    lats = np.array([0.0, 0.0, 0.001, 0.0, 0.0])
+    lons = np.array([0.0, 0.001, 0.001, 0.001, 0.0])
+
+    assert simplify_indices(lats, lons, 1).tolist() == [0, 1, 2, 3, 4]
+    assert simplify_indices(lats[:2], lons[:2], 1).tolist() == [0, 1]
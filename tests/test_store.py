@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+
+import polyline
+import pytest
+
+from scripts.store import JsonStore, SqliteStore, copy_store, open_store
+
+
+def payload(start: str, coords: list[tuple[float, float]], distance: int = 1000) -> dict:
+    return {
+        "activity": {
+            "start_date_local": f"{start}T06:00:00Z",
+            "distance": distance,
+            "map": {"polyline": polyline.encode(coords)},
+        },
+        "weather": [{"description": "clear"}],
+    }
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path: Path):
+    store = open_store(tmp_path / ("activities" if request.param == "json" else "activities.sqlite"))
+    yield store
+    store.close()
+
+
+def test_partial_save_updates_only_given_sections(store) -> None:
+    store.save("1", payload("2026-01-01", [(21.0, 105.8), (21.01, 105.81)]))
+
+    store.save("1", {"uniqueness": {"description": "rare"}, "weather": []}, ["uniqueness"])
+    store.save("1", {}, ["weather"])
+
+    loaded = store.load("1")
+    assert list(loaded) == ["activity", "uniqueness"]
+    assert loaded["uniqueness"] == {"description": "rare"}
+    assert store.load("1", ["uniqueness"]) == {"uniqueness": {"description": "rare"}}
+    assert store.load("missing") is None
+
+
+def test_query_by_date_and_bbox(store) -> None:
+    store.save("a", payload("2026-01-01", [(21.0, 105.8), (21.01, 105.81)]))
+    store.save("b", payload("2026-02-01", [(10.0, 106.6), (10.01, 106.61)]))
+    store.save("c", {"weather": []})
+
+    assert store.ids() == ["a", "b", "c"]
+    assert store.query(since="2026-01-15") == ["b"]
+    assert store.query(until="2026-01-15") == ["a"]
+    assert store.query(bbox=(21.005, 105.805, 22.0, 106.0)) == ["a"]
+    assert store.query() == ["a", "b", "c"]
+
+
+def test_sqlite_round_trips_through_json_export(tmp_path: Path) -> None:
+    source = JsonStore(tmp_path / "activities")
+    original = payload("2026-01-01", [(21.0, 105.8), (21.01, 105.81)])
+    source.save("a", original)
+    database = SqliteStore(tmp_path / "activities.sqlite")
+    export = JsonStore(tmp_path / "export")
+
+    assert copy_store(source, database) == 1
+    copy_store(database, export)
+
+    assert (tmp_path / "export" / "a.json").read_text() == (tmp_path / "activities" / "a.json").read_text()
+    assert json.loads((tmp_path / "export" / "a.json").read_text()) == original
+    assert database.centroids()["a"] == pytest.approx((21.005, 105.805))
+    database.close()
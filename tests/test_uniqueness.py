@@ -1,5 +1,7 @@
 import json
+from statistics import median
 
+import numpy as np
 import polyline
 
 from scripts import uniqueness
@@ -31,6 +33,7 @@ def test_main_skips_existing_uniqueness(tmp_path, monkeypatch) -> None:
     new_path.write_text(json.dumps(new_payload), encoding="utf-8")
 
     monkeypatch.setattr(uniqueness, "ACTIVITIES_DIR", activities_dir)
+    monkeypatch.setattr(uniqueness, "MANIFEST_PATH", tmp_path / "manifest.json")
 
     original_text = existing_path.read_text(encoding="utf-8")
 
@@ -40,3 +43,54 @@ def test_main_skips_existing_uniqueness(tmp_path, monkeypatch) -> None:
     updated_new = json.loads(new_path.read_text(encoding="utf-8"))
     assert "uniqueness" in updated_new
     assert "description" in updated_new["uniqueness"]
+
+
+def zscores(values: list[float]) -> list[float]:
+    array = np.array(values, dtype=float)
+    if array.std() == 0:
+        return [0.0] * len(values)
+    return list((array - array.mean()) / array.std())
+
+
+def score_run_item(run_item: dict, reference_runs: list[dict]) -> float:
+    """The original per-activity scorer that raw_scores must match."""
+    others = [run for run in reference_runs if run["id"] != run_item["id"]]
+    runs = [run_item, *others]
+    lat_z = zscores([run["centroid"][0] for run in runs])
+    lon_z = zscores([run["centroid"][1] for run in runs])
+    distances = [
+        float(np.linalg.norm(run_item["vector"] - other["vector"]))
+        + uniqueness.CENTROID_WEIGHT * float(np.hypot(lat_z[0] - lat_z[i], lon_z[0] - lon_z[i]))
+        for i, other in enumerate(others, start=1)
+    ]
+    if all(run.get("distance_m") is not None for run in runs):
+        distance_z = zscores([run["distance_m"] for run in runs])
+        distances = [
+            value + uniqueness.DISTANCE_WEIGHT * abs(distance_z[0] - distance_z[i])
+            for i, value in enumerate(distances, start=1)
+        ]
+    middle = median(distances)
+    if middle == 0:
+        return uniqueness.UNIQUENESS_MAX
+    spread = uniqueness.UNIQUENESS_MAX - uniqueness.UNIQUENESS_MIN
+    return uniqueness.UNIQUENESS_MAX - min(distances) / middle * spread
+
+
+def test_raw_scores_match_per_item_scoring() -> None:
+    items = []
+    for index in range(6):
+        points = [(0.0, 0.0), (0.001 * index, 0.01), (0.01, 0.002 * index), (0.02, 0.02)]
+        payload = {"map": {"polyline": polyline.encode(points)}, "distance": 1000 + 150 * index}
+        items.append((str(index), uniqueness.build_run_item(payload, activity_id=str(index))))
+    items.append(("no-route", None))
+    reference_runs = [run_item for _, run_item in items if run_item]
+
+    raw = uniqueness.raw_scores(uniqueness.RouteSummaries.from_run_items(items))
+
+    assert set(raw) == {str(index) for index in range(6)}
+    for activity_id, run_item in items[:-1]:
+        expected = score_run_item(run_item, reference_runs)
+        assert abs(raw[activity_id] - expected) < 1e-9
+    sections = uniqueness.score_sections(raw, ["0", "no-route"])
+    assert sections["no-route"] == {"description": None}
+    assert uniqueness.score_sections({}, ["0"]) == {}
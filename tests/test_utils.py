@@ -1,6 +1,10 @@
+import json
+import os
 from pathlib import Path
 
-from scripts.utils import load_json, write_json
+import pytest
+
+from scripts.utils import dumps_json, load_json, write_json
 
 
 def test_load_json_round_trip(tmp_path: Path) -> None:
@@ -10,3 +14,56 @@ def test_load_json_round_trip(tmp_path: Path) -> None:
     write_json(path, payload)
 
     assert load_json(path) == payload
+
+
+def test_write_json_skips_identical_bytes(tmp_path: Path) -> None:
+    path = tmp_path / "payload.json"
+
+    assert write_json(path, {"alpha": 1})
+    mtime_ns = path.stat().st_mtime_ns
+    assert not write_json(path, {"alpha": 1})
+    assert path.stat().st_mtime_ns == mtime_ns
+    assert write_json(path, {"alpha": 2})
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_dumps_json_matches_stdlib_format() -> None:
+    payload = {"name": "Hoàn Kiếm", "values": [1, 2.5, None], "empty": {}, "nested": {"a": []}}
+
+    expected = json.dumps(payload, ensure_ascii=True, indent=2).encode("ascii")
+
+    assert dumps_json(payload) == expected
+    assert dumps_json({**payload, "name": "ascii"}) == json.dumps(
+        {**payload, "name": "ascii"}, ensure_ascii=True, indent=2
+    ).encode("ascii")
+
+
+def test_dumps_json_keeps_non_finite_floats() -> None:
+    payload = {"values": [1.5, float("nan"), None], "pace": float("inf")}
+
+    assert dumps_json(payload) == json.dumps(payload, indent=2).encode("ascii")
+    assert json.loads(dumps_json({"small": 1e-05}))["small"] == 1e-05
+
+
+def test_write_json_keeps_the_mode_of_an_existing_file(tmp_path: Path) -> None:
+    path = tmp_path / "payload.json"
+    write_json(path, {"alpha": 1})
+    umask = os.umask(0o022)
+    os.umask(umask)
+    assert path.stat().st_mode & 0o777 == 0o666 & ~umask
+
+    path.chmod(0o640)
+    write_json(path, {"alpha": 2})
+
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+def test_write_json_keeps_old_file_when_serialization_fails(tmp_path: Path) -> None:
+    path = tmp_path / "payload.json"
+    write_json(path, {"alpha": 1})
+
+    with pytest.raises(TypeError):
+        write_json(path, {"alpha": object()})
+
+    assert load_json(path) == {"alpha": 1}
+    assert list(tmp_path.iterdir()) == [path]
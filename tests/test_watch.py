@@ -0,0 +1,80 @@
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+
+from benchmarks.generators import START, write_gpx, write_tcx
+from scripts import activity, merge, watch
+from scripts.store import JsonStore
+from tests.test_pipeline import setup_tree
+
+
+def write_pair(raw_dir: Path, stem: str, day: int) -> None:
+    start = START + timedelta(days=day)
+    write_gpx(raw_dir / f"{stem}.gpx", 30, seed=day, start=start)
+    write_tcx(raw_dir / f"{stem}.tcx", 30, seed=day, start=start)
+
+
+def test_watcher_processes_settled_new_files_only(tmp_path: Path, monkeypatch) -> None:
+    setup_tree(tmp_path, monkeypatch)
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    for path in activity.GPX_DIR.iterdir():
+        path.unlink()
+    monkeypatch.setattr(merge, "RAW_DIR", raw_dir)
+    monkeypatch.setattr(merge, "OUT_DIR", activity.GPX_DIR)
+    monkeypatch.setattr(merge, "INDEX_PATH", tmp_path / "raw-index.json")
+    monkeypatch.setattr(merge, "MANIFEST_PATH", activity.MANIFEST_PATH)
+    write_pair(raw_dir, "first", 0)
+    watcher = watch.Watcher(JsonStore(activity.OUTPUT_DIR))
+
+    first = watcher.cycle()
+    assert len(first) == 1
+    assert watcher.cycle() == []
+
+    write_pair(raw_dir, "second", 1)
+    # The first poll after a change only notes it; the next one processes it.
+    assert watcher.cycle() == []
+    second = watcher.cycle()
+    assert len(second) == 1 and second != first
+    assert sorted(JsonStore(activity.OUTPUT_DIR).ids()) == sorted(first + second)
+    assert watcher.cycle() == []
+
+
+def test_failed_pipeline_runs_are_retried(tmp_path: Path, monkeypatch) -> None:
+    setup_tree(tmp_path, monkeypatch)
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    monkeypatch.setattr(merge, "RAW_DIR", raw_dir)
+    monkeypatch.setattr(merge, "OUT_DIR", tmp_path / "merged")
+    monkeypatch.setattr(merge, "INDEX_PATH", tmp_path / "raw-index.json")
+    monkeypatch.setattr(merge, "MANIFEST_PATH", activity.MANIFEST_PATH)
+    runs: list[set[str] | None] = []
+
+    class FlakyPipeline:
+        def run(self, only=None, store=None) -> list[str]:
+            runs.append(only)
+            if len(runs) == 2:
+                raise RuntimeError("boom")
+            return sorted(only or [])
+
+    watcher = watch.Watcher(JsonStore(activity.OUTPUT_DIR), pipeline=FlakyPipeline())
+    assert watcher.cycle() == []
+    write_pair(raw_dir, "first", 0)
+    watcher.cycle()
+
+    with pytest.raises(RuntimeError):
+        watcher.cycle()
+    retried = watcher.cycle()
+
+    assert len(retried) == 1 and runs[1] == runs[2] == set(retried)
+    assert watcher.cycle() == []
+    assert len(runs) == 3
+
+
+def test_snapshot_ignores_other_files(tmp_path: Path) -> None:
+    (tmp_path / "run.GPX").write_text("x", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("x", encoding="utf-8")
+
+    assert list(watch.snapshot(tmp_path)) == ["run.GPX"]
+    assert watch.snapshot(tmp_path / "missing") == {}
@@ -1,45 +1,58 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+
+from benchmarks.generators import FakeTable, dynamodb_items
+from scripts import weather_archive, weather_traffic
+from scripts.manifest import Manifest
+from scripts.store import JsonStore
 from scripts.weather_traffic import (
     FEELS_LIKE_FREEZING,
     TRAFFIC_CRAWLING,
+    SampleIndex,
+    Samples,
     build_traffic_entries,
     build_weather_entries,
-    filter_items_by_hour,
+    decode_items,
 )
 
 
-def test_filter_items_by_hour_orders_and_filters() -> None:
+def test_decode_items_sorts_samples_per_context() -> None:
     items = [
-        {"hour": 10, "data": {}},
-        {"hour": 5, "data": {}},
-        {"hour": 20, "data": {}},
+        {
+            "hour": Decimal(10),
+            "context": "weather",
+            "data": {"weather_description": "rain", "feels_like": Decimal("1.5")},
+        },
+        {"hour": 5, "context": "weather", "data": {"weather_description": "sun", "feels_like": 3}},
+        {"hour": 9, "context": "traffic", "data": {"currentSpeed": 10, "freeFlowSpeed": 20}},
     ]
 
-    filtered = filter_items_by_hour(items, 5, 15)
+    samples = decode_items(items)
 
-    assert [item["hour"] for item in filtered] == [
-        5,
-        10,
-    ]
+    assert samples["weather"].hours.tolist() == [5, 10]
+    assert samples["weather"].values.tolist() == [3.0, 1.5]
+    assert samples["weather"].descriptions == ("sun", "rain")
+    assert samples["traffic"].values.tolist() == [0.5]
 
 
-def test_filter_items_by_hour_applies_context() -> None:
-    items = [
-        {"hour": 9, "context": "weather", "data": {}},
-        {"hour": 9, "context": "traffic", "data": {}},
-    ]
+def test_samples_between_is_inclusive() -> None:
+    samples = Samples(
+        np.array([5, 10, 15, 20], dtype=np.int8),
+        np.zeros(4, dtype=np.float64),
+        ("a", "b", "c", "d"),
+    )
 
-    filtered = filter_items_by_hour(items, 8, 10, context="weather")
+    window = samples.between(10, 15)
 
-    assert len(filtered) == 1
-    assert filtered[0]["context"] == "weather"
+    assert window.hours.tolist() == [10, 15]
+    assert window.descriptions == ("b", "c")
 
 
 def test_build_weather_entries_keeps_expected_fields() -> None:
     entries = build_weather_entries(
-        [
-            {"data": {"weather_description": "rain", "feels_like": 1, "extra": 5}},
-            {"data": {"weather_description": "clear", "feels_like": 3}},
-        ]
+        Samples(np.array([6, 7]), np.array([1.0, 3.0]), ("rain", "clear"))
     )
 
     assert entries[0]["description"] == "rain"
@@ -49,12 +62,103 @@ def test_build_weather_entries_keeps_expected_fields() -> None:
 
 
 def test_build_traffic_entries_keeps_expected_fields() -> None:
-    entries = build_traffic_entries(
-        [
-            {"data": {"currentSpeed": 10, "freeFlowSpeed": 20, "extra": 5}},
-            {"data": {"currentSpeed": 12, "freeFlowSpeed": 22}},
-        ]
-    )
+    entries = build_traffic_entries(Samples(np.array([6, 7]), np.array([0.5, 12 / 22])))
 
     assert entries[0]["description"] in set(TRAFFIC_CRAWLING)
     assert entries[1]["description"] in set(TRAFFIC_CRAWLING)
+
+
+def index_for(*days: date) -> SampleIndex:
+    return SampleIndex.from_items({day.isoformat(): dynamodb_items([day]) for day in days})
+
+
+def test_window_continues_past_midnight() -> None:
+    index = index_for(date(2026, 1, 1), date(2026, 1, 2))
+
+    window = index.window("weather", datetime(2026, 1, 1, 22, 30), datetime(2026, 1, 2, 1, 10))
+    # The next date is not indexed, so only the hour before midnight is found.
+    late = index.window("traffic", datetime(2026, 1, 2, 23), datetime(2026, 1, 3, 0))
+
+    assert window.hours.tolist() == [22, 23, 0, 1]
+    assert len(window.descriptions) == 4
+    assert late.hours.tolist() == [23]
+
+
+def test_refresh_samples_runs_past_midnight(tmp_path) -> None:
+    payload = {"activity": {"start_date_local": "2026-01-01T23:30:00Z", "moving_time": 1800}}
+    manifest = Manifest(tmp_path / "manifest.json")
+
+    assert weather_traffic.pending_dates([("a", payload)], manifest) == {
+        "a": ["2026-01-01", "2026-01-02"]
+    }
+    index = index_for(date(2026, 1, 1), date(2026, 1, 2))
+    assert weather_traffic.refresh_weather_traffic("a", payload, manifest, index)
+    assert len(payload["weather"]) == len(payload["traffic"]) == 3
+
+
+def test_traffic_ratios_on_bucket_edges_keep_their_bucket() -> None:
+    items = [
+        {"hour": 6, "context": "traffic", "data": {"currentSpeed": 16, "freeFlowSpeed": 40}},
+        {"hour": 7, "context": "traffic", "data": {"currentSpeed": 22, "freeFlowSpeed": 40}},
+    ]
+
+    samples = decode_items(items)["traffic"]
+    entries = build_traffic_entries(samples)
+
+    assert samples.values.tolist() == [16 / 40, 22 / 40]
+    # 0.4 is severe gridlock and 0.55 is crawling, as with Python floats.
+    assert entries[0]["description"] not in set(TRAFFIC_CRAWLING)
+    assert entries[1]["description"] in set(TRAFFIC_CRAWLING)
+
+
+def test_query_items_uses_date_index(monkeypatch) -> None:
+    monkeypatch.setattr(weather_traffic, "_UNINDEXED_TABLES", set())
+    items = dynamodb_items([date(2026, 1, 1), date(2026, 1, 2)])
+    table = FakeTable(items, page_size=10)
+
+    found = weather_traffic.query_items(table, "2026-01-02")
+
+    assert len(found) == 48
+    # Only the projected attributes come back; date and context_hour stay behind.
+    assert {tuple(sorted(item)) for item in found} == {("context", "data", "hour")}
+    assert {tuple(sorted(item["data"])) for item in found} == {
+        ("feels_like", "weather_description"),
+        ("currentSpeed", "freeFlowSpeed"),
+    }
+    assert table.scans == 0
+    assert table.queries == 5
+
+
+def test_query_items_falls_back_to_scan_without_index(monkeypatch) -> None:
+    monkeypatch.setattr(weather_traffic, "_UNINDEXED_TABLES", set())
+    items = dynamodb_items([date(2026, 1, 1), date(2026, 1, 2)])
+    table = FakeTable(items, page_size=10, indexes=())
+
+    assert len(weather_traffic.query_items(table, "2026-01-01")) == 48
+    assert len(weather_traffic.query_items(table, "2026-01-02")) == 48
+    # The missing index is detected once, then every date is scanned.
+    assert table.queries == 1
+    assert table.scans == 20
+
+
+def test_main_fetches_each_date_once(tmp_path, monkeypatch) -> None:
+    activities_dir = tmp_path / "activities"
+    starts = ["2026-01-01T06:00:00Z", "2026-01-01T17:00:00Z", "2026-01-02T06:30:00Z"]
+    store = JsonStore(activities_dir)
+    for index, start in enumerate(starts):
+        store.save(str(index), {"activity": {"start_date_local": start, "moving_time": 1800}})
+    table = FakeTable(dynamodb_items([date(2026, 1, 1), date(2026, 1, 2)]))
+    monkeypatch.setattr(weather_traffic, "ACTIVITIES_DIR", activities_dir)
+    monkeypatch.setattr(weather_traffic, "MANIFEST_PATH", tmp_path / "manifest.json")
+    monkeypatch.setattr(weather_archive, "ARCHIVE_PATH", tmp_path / "weather.sqlite")
+    monkeypatch.setattr(weather_traffic, "_UNINDEXED_TABLES", set())
+    monkeypatch.setattr(weather_traffic, "thread_table", lambda: table)
+
+    weather_traffic.main([])
+
+    assert table.queries == 2
+    for index in range(3):
+        payload = store.load(str(index))
+        assert payload["weather"] and payload["traffic"]
+    weather_traffic.main([])
+    assert table.queries == 2
@@ -0,0 +1,80 @@
+from datetime import date
+from pathlib import Path
+
+from benchmarks.generators import FakeTable, dynamodb_items
+from scripts import weather_archive, weather_traffic
+from scripts.weather_archive import WeatherArchive, load_dates
+
+
+def fetcher(table: FakeTable):
+    return lambda dates: weather_traffic.fetch_dates(dates, get_table=lambda: table)
+
+
+def test_settled_dates_are_fetched_once(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(weather_archive, "local_today", lambda: date(2026, 1, 4))
+    table = FakeTable(dynamodb_items([date(2026, 1, 1), date(2026, 1, 2)]))
+    archive = WeatherArchive(tmp_path / "weather.sqlite")
+
+    loaded = load_dates(archive, ["2026-01-02", "2026-01-01"], fetcher(table))
+
+    assert list(loaded) == ["2026-01-01", "2026-01-02"]
+    assert len(loaded["2026-01-01"]) == 48
+    first = loaded["2026-01-01"][0]
+    assert first["hour"] == 0 and first["context"] == "traffic"
+    assert first["data"]["freeFlowSpeed"] == 40.0
+    assert table.queries == 2
+    assert load_dates(archive, ["2026-01-01", "2026-01-02"], fetcher(table)) == loaded
+    assert table.queries == 2
+
+
+def test_today_is_fetched_again(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(weather_archive, "local_today", lambda: date(2026, 1, 1))
+    table = FakeTable(dynamodb_items([date(2026, 1, 1)]))
+    archive = WeatherArchive(tmp_path / "weather.sqlite")
+
+    load_dates(archive, ["2026-01-01"], fetcher(table))
+    load_dates(archive, ["2026-01-01"], fetcher(table))
+
+    assert table.queries == 2
+    assert len(archive.items("2026-01-01")) == 48
+
+
+def test_recent_dates_are_retried_without_losing_rows(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(weather_archive, "local_today", lambda: date(2026, 1, 2))
+    table = FakeTable(dynamodb_items([date(2026, 1, 1)]))
+    archive = WeatherArchive(tmp_path / "weather.sqlite")
+
+    load_dates(archive, ["2026-01-01"], fetcher(FakeTable([])))
+    assert archive.items("2026-01-01") == []
+    load_dates(archive, ["2026-01-01"], fetcher(table))
+    # A short answer later (items expiring) keeps what was archived.
+    load_dates(archive, ["2026-01-01"], fetcher(FakeTable(table.items[:10])))
+
+    assert len(archive.items("2026-01-01")) == 48
+    assert archive.complete_dates() == set()
+
+
+def test_backfill_adds_unindexed_items_to_the_date_index(monkeypatch) -> None:
+    monkeypatch.setattr(weather_traffic, "_UNINDEXED_TABLES", set())
+    items = dynamodb_items([date(2026, 1, 1)])
+    for item in items[:10]:
+        del item["context_hour"]
+    table = FakeTable(items, page_size=7)
+
+    assert len(weather_traffic.query_items(table, "2026-01-01")) == 38
+    assert weather_traffic.backfill_context_hour(table) == 10
+    assert len(weather_traffic.query_items(table, "2026-01-01")) == 48
+    assert weather_traffic.backfill_context_hour(table) == 0
+
+
+def test_offline_reads_only_the_archive(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(weather_archive, "local_today", lambda: date(2026, 1, 3))
+    table = FakeTable(dynamodb_items([date(2026, 1, 1)]))
+    path = tmp_path / "weather.sqlite"
+    WeatherArchive(path).add("2026-01-01", table.items, complete=True)
+
+    loaded = load_dates(WeatherArchive(path), ["2026-01-01", "2026-01-02"], None)
+
+    assert len(loaded["2026-01-01"]) == 48
+    assert loaded["2026-01-02"] == []
+    assert table.queries == 0